@@ -2,27 +2,62 @@
 """Static blog builder. Converts markdown posts to HTML with index and RSS."""
 
 import argparse
+import gzip
 import hashlib
 import json
 import re
+import select
 import shutil
+import signal
+import struct
+import sys
 import html
-import xml.etree.ElementTree as ET
+import os
+import threading
+import time
+import tracemalloc
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import quote, urljoin
+from xml.sax.saxutils import escape as xml_escape
 
 import yaml
 import markdown
+from markdown.extensions import codehilite
 from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name as _get_lexer_by_name
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps, features
     HAS_PIL = True
+    HAS_WEBP = features.check("webp")
+    HAS_AVIF = features.check("avif")
 except ImportError:
     HAS_PIL = False
+    HAS_WEBP = False
+    HAS_AVIF = False
 
-THUMB_HEIGHT = 80  # px, fixed height for thumbnails
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+THUMB_HEIGHT = 80  # px, fixed height for thumbnails (1x)
 THUMB_DIR_NAME = "thumbs"
+THUMB_SCALES = (1, 2)  # 1x and 2x (HiDPI) variants
+RESPONSIVE_DIR_NAME = "responsive"
+RESPONSIVE_WIDTHS = (480, 960, 1600)  # px, srcset widths generated for post images
+RESPONSIVE_SIZES = "(max-width: 800px) 100vw, 800px"  # rendered width of post images
+RESPONSIVE_SOURCES = {".jpg": "jpg", ".jpeg": "jpg", ".png": "png"}  # source suffix -> fallback format
+EAGER_MEDIA = 1  # leading images/iframes of a post loaded eagerly; the rest are lazy
+# Generated under files/ but shipped with the site, also in --cdn builds
+GENERATED_DIRS = (THUMB_DIR_NAME, RESPONSIVE_DIR_NAME)
 
 # --- Config ---
 BLOG_DIR = Path(__file__).parent
@@ -31,8 +66,17 @@ TEMPLATE_DIR = BLOG_DIR / "templates"
 STATIC_DIR = BLOG_DIR / "static"
 FILES_DIR = BLOG_DIR / "files"
 COMMENTS_DIR = BLOG_DIR / "comments"
+# Generated files/ assets live here, not in the source tree: files/thumbs/x.png
+# is VARIANTS_DIR/files/thumbs/x.png. Named by content hash, kept across builds.
+VARIANTS_DIR = BLOG_DIR / ".variants"
 SITE_URL = "https://k1monfared.github.io/notes/blog"
+FEED_SIZE = 20  # newest posts per feed
 COMMENT_ENDPOINT = ""  # Set to serverless function URL when ready
+PAGE_SIZE = 10  # posts per listing page (index, tag pages)
+COMPRESS_SUFFIXES = {".html", ".css", ".js", ".xml", ".json", ".svg"}
+COMPRESS_MIN_SIZE = 256  # bytes; smaller outputs get no .gz/.br siblings
+BROTLI_QUALITY = 9  # 11 is ~10x slower for a few % smaller pages
+SEARCH_DIR_NAME = "search"  # _site/search/: search page, docs.json and index shards
 
 MD_EXTENSIONS = ["extra", "codehilite", "toc", "smarty", "md_in_html"]
 def unicode_slugify(value, separator='-'):
@@ -54,9 +98,51 @@ GITHUB_LINK_RE = re.compile(
 CDN_BASE_URL = "https://raw.githubusercontent.com/k1monfared/notes/main/blog"
 
 
+# Text passes over posts are precompiled and written to start with a literal
+# where possible: CPython's re only uses its fast substring search for
+# patterns with a literal prefix. (Fusing the passes into one alternation
+# loses that and measured 2-3x slower; see scripts/bench_text_passes.py.)
+FILES_REF_RE = re.compile(r'files/(?<![a-z/]files/)([^"\')\]\s]+)')  # files/... not inside another path
+_NOT_GENERATED = "".join(f"(?!{name}/)" for name in GENERATED_DIRS)
+CDN_FILES_RE = re.compile(
+    rf"""files/{_NOT_GENERATED}(?:(?<=src="files/)|(?<=src='files/)|(?<=href="files/)|(?<=href='files/))""")
+SRCSET_RE = re.compile(r'(srcset=["\'])([^"\']*)')
+SRCSET_FILES_RE = re.compile(rf'(^|,\s*)files/{_NOT_GENERATED}')
+
+
+def is_generated(asset):
+    """True for files/ assets the build generates (thumbnails, responsive variants)."""
+    return asset.split("/", 2)[1] in GENERATED_DIRS
+
+
+def asset_source(asset):
+    """Where a files/ asset is read from: VARIANTS_DIR if generated, else BLOG_DIR."""
+    return (VARIANTS_DIR if is_generated(asset) else BLOG_DIR) / asset
+
+
+def existing_variants():
+    """files/-relative paths of the generated assets on disk, from one
+    directory listing each (rather than a stat per variant)."""
+    found = set()
+    for name in GENERATED_DIRS:
+        try:
+            found.update(f"files/{name}/{entry}" for entry in os.listdir(VARIANTS_DIR / "files" / name))
+        except FileNotFoundError:
+            pass
+    return found
+
+
 def rewrite_cdn_urls(html_text, cdn_base):
-    """Rewrite relative files/ paths to absolute CDN URLs."""
-    return re.sub(r'((?:src|href)=["\'])files/', rf'\1{cdn_base}/files/', html_text)
+    """Rewrite relative files/ paths to absolute CDN URLs. Generated assets
+    are not on the CDN (they aren't committed) and keep their local paths."""
+    cdn_files = f"{cdn_base}/files/"
+    html_text = CDN_FILES_RE.sub(lambda m: cdn_files, html_text)
+    if "srcset=" not in html_text:
+        return html_text
+    return SRCSET_RE.sub(
+        lambda m: m.group(1) + SRCSET_FILES_RE.sub(lambda f: f.group(1) + cdn_files, m.group(2)),
+        html_text,
+    )
 
 
 def parse_filename(filename):
@@ -71,27 +157,236 @@ def parse_filename(filename):
     return date, slug, f"{date_str[:8]}-{slug}"
 
 
-def generate_thumbnail(src_path, thumb_path, height=THUMB_HEIGHT):
-    """Generate a small PNG thumbnail with fixed height, preserving aspect ratio."""
+def thumbnail_path(key, scale=1, ext="png"):
+    """files/-relative path of one thumbnail variant for a source content hash."""
+    suffix = "" if scale == 1 else f"@{scale}x"
+    return f"files/{THUMB_DIR_NAME}/{key}{suffix}.{ext}"
+
+
+def thumbnail_variants(key):
+    """All files/-relative thumbnail paths generated for a source content hash."""
+    exts = ("png", "webp") if HAS_WEBP else ("png",)
+    return [thumbnail_path(key, scale, ext) for scale in THUMB_SCALES for ext in exts]
+
+
+def generate_thumbnails(src_path, key, height=THUMB_HEIGHT):
+    """Write every thumbnail variant for src_path from a single decode.
+
+    Outputs are named by key (the source's content hash), so existing files
+    are reused as-is: a renamed or touched image costs nothing. JPEGs are
+    decoded with draft() at the smallest DCT scale that still covers the
+    largest variant, then reduce() drops the remaining integer factor before
+    the final LANCZOS resizes. Runs in a worker process when there is more
+    than one to generate and more than one encode worker.
+    Returns True when all variants exist."""
     if not HAS_PIL:
         return False
-    if thumb_path.exists():
-        # Only regenerate if source is newer
-        if thumb_path.stat().st_mtime >= src_path.stat().st_mtime:
-            return True
+    outputs = {rel: asset_source(rel) for rel in thumbnail_variants(key)}
+    if all(path.exists() for path in outputs.values()):
+        return True
     try:
         with Image.open(src_path) as img:
-            ratio = height / img.height
-            width = int(img.width * ratio)
-            img = img.resize((width, height), Image.LANCZOS)
-            img = img.convert("RGB")
-            thumb_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(thumb_path, "PNG", optimize=True)
+            largest = height * max(THUMB_SCALES)
+            img.draft("RGB", (img.width * largest // img.height, largest))
+            factor = img.height // (largest * 2)  # keep 2x headroom for LANCZOS
+            if factor > 1:
+                img = img.reduce(factor)
+            img = img.convert("RGB") if img.mode not in ("RGB", "RGBA") else img
+            for scale in sorted(THUMB_SCALES, reverse=True):
+                h = height * scale
+                img = img.resize((max(1, round(img.width * h / img.height)), h), Image.LANCZOS)
+                rgb = img.convert("RGB")
+                png = outputs[thumbnail_path(key, scale, "png")]
+                png.parent.mkdir(parents=True, exist_ok=True)
+                rgb.save(png, "PNG", optimize=True)
+                if HAS_WEBP:
+                    rgb.save(outputs[thumbnail_path(key, scale, "webp")], "WEBP", quality=80, method=4)
         return True
     except Exception:
         return False
 
 
+def thumbnail_html(thumb):
+    """<img> (or <picture> with WebP sources) for a post listing thumbnail."""
+    src = html.escape(thumb)
+    match = re.fullmatch(rf"files/{THUMB_DIR_NAME}/(\w+)\.png", thumb)
+    if not match:
+        return f'<img class="post-thumbnail" src="{src}" alt="" loading="lazy">'
+    key = match.group(1)
+
+    def srcset(ext):
+        return ", ".join(f"{thumbnail_path(key, scale, ext)} {scale}x" for scale in THUMB_SCALES)
+
+    img = (f'<img class="post-thumbnail" src="{src}" srcset="{srcset("png")}" '
+           f'height="{THUMB_HEIGHT}" alt="" loading="lazy">')
+    if not HAS_WEBP:
+        return img
+    return f'<picture><source type="image/webp" srcset="{srcset("webp")}">{img}</picture>'
+
+
+def probe_image(path):
+    """(width, height, responsive) of an image as displayed (EXIF rotation
+    applied), read from its header only. responsive is False for formats
+    and animations that get no generated variants. None if unreadable."""
+    if not HAS_PIL:
+        return None
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            if img.getexif().get(0x0112) in (5, 6, 7, 8):  # Orientation: rotated 90/270
+                width, height = height, width
+            responsive = (path.suffix.lower() in RESPONSIVE_SOURCES
+                          and not getattr(img, "is_animated", False))
+            return width, height, responsive
+    except Exception:
+        return None
+
+
+def responsive_widths(width):
+    """srcset widths generated for an image width px wide. The original is
+    re-encoded (AVIF/WebP) at its own width when that is within range."""
+    widths = [w for w in RESPONSIVE_WIDTHS if w < width]
+    if width <= RESPONSIVE_WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def responsive_formats(fallback):
+    """Variant formats, preferred first: AVIF and WebP (when Pillow has them),
+    then the source's own format."""
+    return [ext for ext, ok in (("avif", HAS_AVIF), ("webp", HAS_WEBP)) if ok] + [fallback]
+
+
+def responsive_path(key, width, ext):
+    """files/-relative path of one responsive variant for a source content hash."""
+    return f"files/{RESPONSIVE_DIR_NAME}/{key}-{width}.{ext}"
+
+
+def responsive_variants(key, width, fallback):
+    """All files/-relative variant paths generated for an image. The original
+    file serves as the fallback format at full width."""
+    return [responsive_path(key, w, ext)
+            for w in responsive_widths(width) for ext in responsive_formats(fallback)
+            if not (w == width and ext == fallback)]
+
+
+def generate_responsive(src_path, key, width, height, fallback):
+    """Write every responsive variant of src_path from a single decode.
+
+    Like thumbnails, outputs are named by the source's content hash, so
+    existing ones are reused as-is. Each variant is resized from the next
+    larger one; files are written to a temp name and renamed into place, so
+    an interrupted build never leaves a truncated variant behind. Runs in a
+    worker process, like generate_thumbnails. Returns True when all variants exist."""
+    if not HAS_PIL:
+        return False
+    outputs = [asset_source(rel) for rel in responsive_variants(key, width, fallback)]
+    if all(path.exists() for path in outputs):
+        return True
+    try:
+        with Image.open(src_path) as img:
+            img = ImageOps.exif_transpose(img)
+            alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            img = img.convert("RGBA" if alpha and fallback == "png" else "RGB")
+            widths = sorted(responsive_widths(width), reverse=True)
+            factor = img.width // (widths[0] * 2)  # keep 2x headroom for LANCZOS
+            if factor > 1:
+                img = img.reduce(factor)
+            for w in widths:
+                if img.width != w:
+                    img = img.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+                for ext in responsive_formats(fallback):
+                    if w == width and ext == fallback:
+                        continue
+                    out = asset_source(responsive_path(key, w, ext))
+                    if out.exists():
+                        continue
+                    out.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = out.with_name(out.name + ".tmp")
+                    if ext == "avif":
+                        img.save(tmp, "AVIF", quality=60, speed=8)
+                    elif ext == "webp":
+                        img.save(tmp, "WEBP", quality=80, method=4)
+                    elif ext == "jpg":
+                        img.save(tmp, "JPEG", quality=82, optimize=True, progressive=True)
+                    else:
+                        img.save(tmp, "PNG", optimize=True)
+                    os.replace(tmp, out)
+        return True
+    except Exception:
+        return False
+
+
+IMG_TAG_RE = re.compile(r"<(?:img|iframe)\s[^>]*>")
+SRC_ATTR_RE = re.compile(r'\ssrc=(["\'])(.*?)\1')
+
+
+def responsive_media(post_html, images):
+    """Rewrite the <img> and <iframe> tags of a rendered post.
+
+    images maps a files/ src to {"width", "height", "key", "fallback"};
+    "key" is only set once the image's variants exist. Known images get
+    explicit width/height (no layout shift) and, with variants, a <picture>
+    with AVIF/WebP sources and srcset/sizes. Everything after the first
+    EAGER_MEDIA tags is marked loading="lazy". Tags that already carry the
+    attributes are left alone."""
+    count = 0
+
+    def _repl(match):
+        nonlocal count
+        tag = match.group(0)
+        count += 1
+        head, close = (tag[:-2].rstrip(), " />") if tag.endswith("/>") else (tag[:-1], ">")
+        attrs = []
+        src = SRC_ATTR_RE.search(tag)
+        info = images.get(html.unescape(src.group(2))) if src and tag.startswith("<img") else None
+        sources = ""
+        if info:
+            if "width=" not in tag and "height=" not in tag:
+                attrs.append(f'width="{info["width"]}" height="{info["height"]}"')
+            url = src.group(2)
+            if info.get("key") and "srcset=" not in tag and " " not in url and "," not in url:
+                key, width, fallback = info["key"], info["width"], info["fallback"]
+                widths = responsive_widths(width)
+
+                def srcset(ext):
+                    return ", ".join(
+                        f"{url if w == width and ext == fallback else responsive_path(key, w, ext)} {w}w"
+                        for w in widths)
+
+                fallback_set = srcset(fallback)
+                if width not in widths:
+                    fallback_set += f", {url} {width}w"
+                attrs.append(f'srcset="{fallback_set}" sizes="{RESPONSIVE_SIZES}"')
+                sources = "".join(
+                    f'<source type="image/{ext}" srcset="{srcset(ext)}" sizes="{RESPONSIVE_SIZES}">'
+                    for ext in responsive_formats(fallback)[:-1])
+        if count > EAGER_MEDIA and "loading=" not in tag:
+            attrs.append('loading="lazy"')
+        if tag.startswith("<img") and "decoding=" not in tag:
+            attrs.append('decoding="async"')
+        if not attrs:
+            return tag
+        tag = f'{head} {" ".join(attrs)}{close}'
+        return f"<picture>{sources}{tag}</picture>" if sources else tag
+
+    return IMG_TAG_RE.sub(_repl, post_html)
+
+
+def make_pager(prefix, page, page_count):
+    """Newer/older navigation for page (1-based) of a listing rooted at prefix."""
+    if page_count <= 1:
+        return ""
+
+    def url(n):
+        return (prefix or "./") if n == 1 else f"{prefix}page/{n}/"
+
+    newer = f'<a href="{url(page - 1)}" rel="prev">&larr; Newer</a>' if page > 1 else "<span></span>"
+    older = f'<a href="{url(page + 1)}" rel="next">Older &rarr;</a>' if page < page_count else "<span></span>"
+    return (f'<nav class="pager">{newer}'
+            f'<span class="pager-status">Page {page} of {page_count}</span>{older}</nav>')
+
+
 def parse_frontmatter(text):
     """Parse optional key: value frontmatter delimited by ---. Returns (meta, body)."""
     meta = {}
@@ -142,14 +437,20 @@ def extract_title(text):
     return "Untitled", text, None
 
 
+EXCERPT_HEADING_RE = re.compile(r"#(?<![^\n]#)#{0,5}\s+.*$", re.MULTILINE)  # ^#{1,6}\s+.*$
+EXCERPT_IMAGE_RE = re.compile(r"!\[.*?\]\(.*?\)")
+EXCERPT_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+
+
 def extract_excerpt(text, max_len=200):
     """Extract first paragraph of plain text as excerpt."""
     # Remove headings, images, links-as-images
-    clean = re.sub(r"^#{1,6}\s+.*$", "", text, flags=re.MULTILINE)
-    clean = re.sub(r"!\[.*?\]\(.*?\)", "", clean)
-    clean = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", clean)
-    clean = re.sub(r"[*_`~]", "", clean)
-    clean = re.sub(r"<[^>]+>", "", clean)
+    clean = EXCERPT_HEADING_RE.sub("", text)
+    clean = EXCERPT_IMAGE_RE.sub("", clean)
+    clean = EXCERPT_LINK_RE.sub(r"\1", clean)
+    clean = clean.replace("*", "").replace("_", "").replace("`", "").replace("~", "")
+    clean = HTML_TAG_RE.sub("", clean)
     for para in clean.split("\n\n"):
         para = para.strip()
         if para and not para.startswith("[") and len(para) > 20:
@@ -159,16 +460,48 @@ def extract_excerpt(text, max_len=200):
     return ""
 
 
-def find_referenced_assets(text):
-    """Find all files/ references in the post content."""
-    refs = set()
-    for match in re.finditer(r'(?:src|href)=["\']?(files/[^"\')\s]+)', text):
-        refs.add(match.group(1))
-    for match in re.finditer(r'\(files/([^)]+)\)', text):
-        refs.add(f"files/{match.group(1)}")
-    for match in re.finditer(r'\[.*?\]\(files/([^)]+)\)', text):
-        refs.add(f"files/{match.group(1)}")
-    return refs
+def parse_post(raw):
+    """Fast metadata pass over a post's source text.
+
+    Returns a dict with the content hash, title (from frontmatter or the
+    first heading), title anchor, remaining markdown content, excerpt, tags,
+    frontmatter thumbnail and the files/ assets referenced by the raw text."""
+    with span("frontmatter"):
+        meta, body = parse_frontmatter(raw)
+
+    title = meta.get("title")
+    title_anchor = None
+    if title:
+        content = body
+    else:
+        with span("extract_title"):
+            title, content, title_anchor = extract_title(body)
+
+    tags = []
+    raw_tags = meta.get("tags", "")
+    if raw_tags:
+        tags = [t.strip().lower() for t in raw_tags.split(",") if t.strip()]
+
+    with span("extract_excerpt"):
+        excerpt = extract_excerpt(content)
+
+    return {
+        "hash": content_hash(raw),
+        "title": title,
+        "title_anchor": title_anchor,
+        "content": content,
+        "excerpt": excerpt,
+        "tags": tags,
+        "thumbnail": meta.get("thumbnail", ""),
+        # Scanned from the raw text (fast, no markdown needed); this also
+        # covers the frontmatter and everything rendering emits
+        "assets": post_assets(raw),
+    }
+
+
+def post_assets(raw):
+    """The files/ assets referenced by a post's source text."""
+    return {f"files/{m.group(1)}" for m in FILES_REF_RE.finditer(raw)}
 
 
 def build_slug_map(posts):
@@ -195,8 +528,10 @@ YOUTU_BE_RE = re.compile(r'https?://youtu\.be/([\w-]+)')
 
 AUDIO_EXTS = {"mp3", "m4a", "wav", "oga", "ogg", "flac", "opus", "aac"}
 VIDEO_EXTS = {"mp4", "mov", "webm", "m4v", "ogv"}
+# ![caption](file.ext) alone on its line; convert_media_links checks that only
+# spaces/tabs precede it (a leading ^[ \t]* would cost the literal prefix)
 MEDIA_RE = re.compile(
-    r'^[ \t]*!\[([^\]]*)\]\(<?([^)>\s]+\.[A-Za-z0-9]+)>?\)[ \t]*$',
+    r'!\[([^\]]*)\]\(<?([^)>\s]+\.[A-Za-z0-9]+)>?\)[ \t]*$',
     re.MULTILINE,
 )
 
@@ -226,12 +561,28 @@ def convert_media_links(text):
                 f'</video>'
             )
         else:
-            return match.group(0)
+            return None
         figcap = (
             f'<figcaption>{html.escape(caption)}</figcaption>' if caption else ''
         )
         return f'\n<figure class="{kind}-figure">{media}{figcap}</figure>\n'
-    return MEDIA_RE.sub(replace, text)
+
+    parts = []
+    done = pos = 0
+    while match := MEDIA_RE.search(text, pos):
+        line_start = text.rfind("\n", 0, match.start()) + 1
+        if text[line_start:match.start()].strip(" \t"):
+            pos = match.start() + 1  # not alone on its line; keep looking
+            continue
+        figure = replace(match)
+        if figure is not None:
+            parts += [text[done:line_start], figure]
+            done = match.end()
+        pos = match.end()
+    if not parts:
+        return text
+    parts.append(text[done:])
+    return "".join(parts)
 
 
 def convert_embeds(text):
@@ -251,10 +602,218 @@ def convert_embeds(text):
     return EMBED_RE.sub(replace_embed, text)
 
 
-def render_markdown(text):
-    """Convert markdown to HTML."""
-    md = markdown.Markdown(extensions=MD_EXTENSIONS, extension_configs=MD_EXTENSION_CONFIGS)
-    return md.convert(text)
+PROFILE_FILE = BLOG_DIR / ".build_profile.json"
+
+
+class Profiler:
+    """Wall time and allocations per build stage and per post.
+
+    Spans are stored as Chrome trace events (complete "X" events with
+    microsecond timestamps), so write_trace() output opens directly in
+    chrome://tracing or ui.perfetto.dev. Allocation figures are the net
+    growth of tracemalloc's traced memory over a span."""
+
+    def __init__(self):
+        self.events = []
+        self._stage = None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _now(self):
+        return time.perf_counter_ns(), tracemalloc.get_traced_memory()[0]
+
+    def _record(self, name, cat, start, args):
+        t0, mem0 = start
+        t1, mem1 = self._now()
+        args["alloc_kb"] = round((mem1 - mem0) / 1024, 1)
+        self.events.append({
+            "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": 0,
+            "ts": t0 / 1000, "dur": (t1 - t0) / 1000, "args": args,
+        })
+
+    @contextmanager
+    def span(self, name, post=None):
+        """Time a block. Yields the event's args dict for extra annotations."""
+        args = {"post": post} if post else {}
+        start = self._now()
+        try:
+            yield args
+        finally:
+            self._record(name, "step", start, args)
+
+    def stage(self, name):
+        """End the current top-level build stage (if any) and start name."""
+        if self._stage:
+            self._record(self._stage[0], "stage", self._stage[1], {})
+        self._stage = (name, self._now()) if name else None
+
+    def write_trace(self, path):
+        main = os.getpid()
+        names = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                  "args": {"name": "build.py" if pid == main else "render worker"}}
+                 for pid in sorted({e["pid"] for e in self.events})]
+        Path(path).write_text(json.dumps({"traceEvents": names + self.events,
+                                          "displayTimeUnit": "ms"}), encoding="utf-8")
+
+    def report(self, top=10):
+        """Print stage totals, per-step totals and the slowest posts."""
+        def table(title, rows):
+            print(title)
+            for name, (n, ms, kb) in rows:
+                print(f"  {name:<16} {n:>5}x {ms:9.1f} ms {kb / 1024:8.1f} MB")
+
+        totals = {}
+        for cat in ("stage", "step"):
+            agg = {}
+            for e in self.events:
+                if e["cat"] == cat:
+                    n, ms, kb = agg.get(e["name"], (0, 0.0, 0.0))
+                    agg[e["name"]] = (n + 1, ms + e["dur"] / 1000, kb + e["args"]["alloc_kb"])
+            totals[cat] = agg
+        table("Profile: build stages", totals["stage"].items())
+        table("Profile: per-post steps (all posts)",
+              sorted(totals["step"].items(), key=lambda kv: -kv[1][1]))
+
+        per_post = {}
+        for e in self.events:
+            post = e["args"].get("post")
+            if post:
+                per_post[post] = per_post.get(post, 0.0) + e["dur"] / 1000
+        print(f"Profile: slowest {top} posts")
+        for post, ms in sorted(per_post.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"  {ms:9.1f} ms  {post}")
+
+
+_profiler = None  # the active Profiler during a --profile build
+
+
+def span(name, post=None):
+    """Profile a block when a Profiler is active; otherwise a no-op."""
+    return _profiler.span(name, post) if _profiler else nullcontext({})
+
+
+def profile_stage(name):
+    """Mark the start of the next top-level build stage (None ends the last)."""
+    if _profiler:
+        _profiler.stage(name)
+
+
+class StageTimer:
+    """Exclusive wall-clock timing of nested stages.
+
+    Entering a stage pauses the enclosing one, so each bucket only counts
+    its own time (e.g. highlighting inside the fenced-code preprocessor is
+    charged to "codehilite", not "parse")."""
+
+    def __init__(self, base):
+        self.totals = {}
+        self.stack = [base]
+        self.mark = time.perf_counter()
+
+    def _switch(self):
+        now = time.perf_counter()
+        top = self.stack[-1]
+        self.totals[top] = self.totals.get(top, 0.0) + now - self.mark
+        self.mark = now
+
+    def push(self, name):
+        self._switch()
+        self.stack.append(name)
+
+    def pop(self):
+        self._switch()
+        self.stack.pop()
+
+    def stop(self):
+        self._switch()
+        return self.totals
+
+
+_md = None
+_md_setup_time = None  # seconds spent building this process's converter, until reported
+_md_timer = None  # StageTimer while a profiled convert is running
+_lexers = {}
+
+# Which markdown treeprocessors count towards which profile stage; the
+# remaining treeprocessors (prettify, attr_list, ...) are "other".
+MD_PROFILE_STAGES = {"inline": "parse", "hilite": "codehilite", "toc": "toc", "smarty": "smarty"}
+
+
+def _timed(fn, stage):
+    """Wrap fn so its time is charged to stage while a profile is running."""
+    def wrapper(*args, **kwargs):
+        if _md_timer is None:
+            return fn(*args, **kwargs)
+        _md_timer.push(stage)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _md_timer.pop()
+    return wrapper
+
+
+def _cached_lexer(name, **options):
+    """get_lexer_by_name with memoization: Pygments lexers are reusable, and
+    looking one up scans the lexer registry on every code block otherwise."""
+    try:
+        key = (name, tuple(sorted(options.items())))
+        hash(key)
+    except TypeError:
+        return _get_lexer_by_name(name, **options)
+    lexer = _lexers.get(key)
+    if lexer is None:
+        lexer = _lexers[key] = _get_lexer_by_name(name, **options)
+    return lexer
+
+
+def _get_markdown():
+    """The per-process converter, built (and instrumented) on first use."""
+    global _md, _md_setup_time
+    if _md is None:
+        t0 = time.perf_counter()
+        codehilite.get_lexer_by_name = _timed(_cached_lexer, "codehilite")
+        codehilite.highlight = _timed(codehilite.highlight, "codehilite")
+        _md = markdown.Markdown(extensions=MD_EXTENSIONS, extension_configs=MD_EXTENSION_CONFIGS)
+        _md_setup_time = time.perf_counter() - t0
+        for proc in _md.preprocessors:
+            proc.run = _timed(proc.run, "parse")
+        _md.parser.parseDocument = _timed(_md.parser.parseDocument, "parse")
+        for name, stage in MD_PROFILE_STAGES.items():
+            if name in _md.treeprocessors:
+                proc = _md.treeprocessors[name]
+                proc.run = _timed(proc.run, stage)
+        _md.serializer = _timed(_md.serializer, "serialize")
+        for proc in _md.postprocessors:
+            proc.run = _timed(proc.run, "serialize")
+    return _md
+
+
+def render_markdown(text, timings=None):
+    """Convert markdown to HTML. One converter is built per process and reset
+    between documents, so extensions are only loaded once.
+
+    If timings is a dict, the per-stage seconds (parse, smarty, codehilite,
+    toc, serialize, other, plus setup the first time in each process) are
+    added to it."""
+    global _md_timer, _md_setup_time
+    md = _get_markdown().reset()
+    if timings is None:
+        return md.convert(text)
+    if _md_setup_time is not None:
+        timings["setup"] = timings.get("setup", 0.0) + _md_setup_time
+        _md_setup_time = None
+    _md_timer = StageTimer("other")
+    try:
+        return md.convert(text)
+    finally:
+        for stage, secs in _md_timer.stop().items():
+            timings[stage] = timings.get(stage, 0.0) + secs
+        _md_timer = None
+
+
+A_TAG_RE = re.compile(r'<a\s+(?![^>]*target=)[^>]*>')  # <a ...> without a target=
+HREF_RE = re.compile(r'href=(["\'])(.*?)\1')
+FRAGMENT_HREF_RE = re.compile(r'href="#([^"]+)"')
 
 
 def add_target_blank(html_text):
@@ -262,11 +821,11 @@ def add_target_blank(html_text):
     In-page anchors (hrefs containing '#') stay in the same tab."""
     def _repl(match):
         tag = match.group(0)
-        href = re.search(r'href=(["\'])(.*?)\1', tag)
+        href = HREF_RE.search(tag)
         if href and "#" in href.group(2):
             return tag
         return tag[:-1] + ' target="_blank" rel="noopener">'
-    return re.sub(r'<a\s+((?:(?!target=)[^>])*)>', _repl, html_text)
+    return A_TAG_RE.sub(_repl, html_text)
 
 
 def fix_fragment_links(html_text, url_slug):
@@ -277,7 +836,66 @@ def fix_fragment_links(html_text, url_slug):
     with the post slug keeps fragment navigation on the post page itself."""
     def _repl(match):
         return f'href="{url_slug}/#{match.group(1)}"'
-    return re.sub(r'href="#([^"]+)"', _repl, html_text)
+    return FRAGMENT_HREF_RE.sub(_repl, html_text)
+
+
+def render_post(content, url_slug, title, title_anchor, date, tags, post_tmpl, slug_map,
+                profile=False):
+    """Render one post body into the post template.
+
+    This is the expensive part of the build (markdown + comments). It only
+    depends on its arguments and module-level config, so it can run in a
+    worker process. Returns (post_html, body_html, profile_data)
+    where body_html is the converted post body alone (for feeds).
+    profile_data is None unless profile is set; then it holds the markdown
+    stage "timings" and the trace "events" recorded for this post."""
+    global _profiler
+    outer_profiler = _profiler
+    if profile:
+        _profiler = Profiler()
+    try:
+        with span("render", post=url_slug):
+            post_html, body_html, timings = _render_post(
+                content, url_slug, title, title_anchor, date, tags, post_tmpl, slug_map, profile)
+        if not profile:
+            return post_html, body_html, None
+        return post_html, body_html, {"timings": timings, "events": _profiler.events}
+    finally:
+        _profiler = outer_profiler
+
+
+def _render_post(content, url_slug, title, title_anchor, date, tags, post_tmpl, slug_map, profile):
+    with span("convert"):
+        content = convert_embeds(content)
+        content = convert_media_links(content)
+        content = rewrite_github_links(content, slug_map)
+
+    timings = {} if profile else None
+    with span("markdown") as args:
+        body_html = add_target_blank(render_markdown(content, timings))
+        body_html = fix_fragment_links(body_html, url_slug)
+        if timings:
+            args.update({stage: round(secs * 1000, 2) for stage, secs in timings.items()})
+    with span("comments"):
+        comments_html = load_comments(url_slug)
+
+    tag_chips_html = ""
+    if tags:
+        chips = " ".join(
+            f'<a href="tag/{t}/" class="tag">{html.escape(t)}</a>' for t in tags
+        )
+        tag_chips_html = f'<span class="tag-chips">{chips}</span>'
+
+    date_str_full = date.strftime("%B %d, %Y")
+    title_id_attr = f' id="{title_anchor}"' if title_anchor else ""
+    with span("template"):
+        post_html = render_template(
+            post_tmpl, title=title, date=date_str_full, body=body_html,
+            comments=comments_html, comment_endpoint=COMMENT_ENDPOINT,
+            post_slug=url_slug, tag_chips=tag_chips_html,
+            title_id_attr=title_id_attr,
+        )
+    return post_html, body_html, timings
 
 
 def generate_pygments_css():
@@ -292,41 +910,294 @@ def load_template(name):
     return (TEMPLATE_DIR / name).read_text()
 
 
+SLOT_RE = re.compile(r"\{\{(\w+)\}\}")
+
+
+class Template:
+    """A {{var}} template parsed once into literal and slot segments.
+
+    render() joins the segments with the slot values in one pass instead of
+    copying the page once per variable. Its result is identical to applying
+    str.replace for each keyword in order, which (unlike a plain join) also
+    substitutes a later keyword's {{var}} appearing inside an earlier value.
+    When a value contains "{{", or a segment ends in a "{" that could combine
+    with its neighbour into a placeholder, render() takes the sequential
+    str.replace path so that edge case keeps the old behaviour."""
+
+    def __init__(self, source):
+        self.source = source
+        self.literals = []  # literals[i] precedes slots[i]; one extra at the end
+        self.slots = []
+        pos = 0
+        for match in SLOT_RE.finditer(source):
+            self.literals.append(source[pos:match.start()])
+            self.slots.append(match.group(1))
+            pos = match.end()
+        self.literals.append(source[pos:])
+        self.max_slot = max(map(len, self.slots), default=0)
+        self._joinable = not any(self._open_tail(lit) for lit in self.literals[:-1])
+
+    def _open_tail(self, text):
+        # "{", "{{", "{{na" or "{{name}" at the end could join with what follows
+        return "{" in text[-(self.max_slot + 4):]
+
+    def render(self, **kwargs):
+        values = {key: str(val) for key, val in kwargs.items()}
+        last = next(reversed(values), None)
+        if self._joinable and not any(
+                (key != last and "{{" in val) or self._open_tail(val)
+                for key, val in values.items()):
+            parts = [self.literals[0]]
+            for name, literal in zip(self.slots, self.literals[1:]):
+                parts.append(values[name] if name in values else f"{{{{{name}}}}}")
+                parts.append(literal)
+            return "".join(parts)
+        result = self.source
+        for key, val in values.items():
+            result = result.replace(f"{{{{{key}}}}}", val)
+        return result
+
+
+compile_template = lru_cache(maxsize=32)(Template)
+
+
 def render_template(template, **kwargs):
-    """Simple {{var}} template substitution."""
-    result = template
-    for key, val in kwargs.items():
-        result = result.replace(f"{{{{{key}}}}}", str(val))
-    return result
-
-
-def generate_rss(posts_data):
-    """Generate RSS 2.0 XML feed."""
-    rss = ET.Element("rss", version="2.0")
-    rss.set("xmlns:atom", "http://www.w3.org/2005/Atom")
-    channel = ET.SubElement(rss, "channel")
-    ET.SubElement(channel, "title").text = "Blog"
-    ET.SubElement(channel, "link").text = f"{SITE_URL}/"
-    atom_link = ET.SubElement(channel, "atom:link")
-    atom_link.set("href", f"{SITE_URL}/feed.xml")
-    atom_link.set("rel", "self")
-    atom_link.set("type", "application/rss+xml")
-    ET.SubElement(channel, "description").text = "Blog posts"
-    ET.SubElement(channel, "language").text = "en-us"
-
-    for post in posts_data[:20]:
-        item = ET.SubElement(channel, "item")
-        ET.SubElement(item, "title").text = post["title"]
-        ET.SubElement(item, "link").text = f"{SITE_URL}/{post['url_slug']}/"
-        ET.SubElement(item, "guid").text = f"{SITE_URL}/{post['url_slug']}/"
-        ET.SubElement(item, "pubDate").text = post["date"].strftime(
-            "%a, %d %b %Y 00:00:00 +0000"
-        )
-        ET.SubElement(item, "description").text = post["excerpt"]
+    """Simple {{var}} template substitution.
 
-    tree = ET.ElementTree(rss)
-    ET.indent(tree)
-    return ET.tostring(rss, encoding="unicode", xml_declaration=True)
+    template is a template string (compiled once and cached) or a Template."""
+    if not isinstance(template, Template):
+        template = compile_template(template)
+    return template.render(**kwargs)
+
+
+def absolute_urls(html_text, base=f"{SITE_URL}/"):
+    """Resolve relative src/href URLs against the site root, as the pages'
+    <base href> does, so feed readers can follow them."""
+    return re.sub(
+        r'(\b(?:src|href)=)(["\'])(.*?)\2',
+        lambda m: f"{m.group(1)}{m.group(2)}{urljoin(base, m.group(3))}{m.group(2)}",
+        html_text,
+    )
+
+
+def cdata(text):
+    """Wrap text in a CDATA section (splitting any "]]>" it contains)."""
+    return "<![CDATA[" + text.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+
+def rss_item(post, content):
+    """One <item> of an RSS feed; content is the post's full HTML."""
+    url = f"{SITE_URL}/{post['url_slug']}/"
+    return "".join([
+        "    <item>\n",
+        f"      <title>{xml_escape(post['title'])}</title>\n",
+        f"      <link>{url}</link>\n",
+        f"      <guid>{url}</guid>\n",
+        f"      <pubDate>{post['date'].strftime('%a, %d %b %Y 00:00:00 +0000')}</pubDate>\n",
+        *(f"      <category>{xml_escape(tag)}</category>\n" for tag in post["tags"]),
+        f"      <description>{xml_escape(post['excerpt'])}</description>\n",
+        f"      <content:encoded>{cdata(content)}</content:encoded>\n",
+        "    </item>\n",
+    ])
+
+
+def rss_feed(title, path, posts, items):
+    """Stream an RSS 2.0 feed of posts; items are their rss_item() texts."""
+    yield "<?xml version='1.0' encoding='utf-8'?>\n"
+    yield ('<rss xmlns:atom="http://www.w3.org/2005/Atom" '
+           'xmlns:content="http://purl.org/rss/1.0/modules/content/" version="2.0">\n')
+    yield "  <channel>\n"
+    yield f"    <title>{xml_escape(title)}</title>\n"
+    yield f"    <link>{SITE_URL}/</link>\n"
+    yield f'    <atom:link href="{xml_escape(f"{SITE_URL}/{quote(path)}")}" rel="self" type="application/rss+xml" />\n'
+    yield "    <description>Blog posts</description>\n"
+    yield "    <language>en-us</language>\n"
+    yield from items
+    yield "  </channel>\n</rss>"
+
+
+def atom_item(post, content):
+    """One <entry> of an Atom feed; content is the post's full HTML."""
+    url = f"{SITE_URL}/{post['url_slug']}/"
+    return "".join([
+        "  <entry>\n",
+        f"    <title>{xml_escape(post['title'])}</title>\n",
+        f'    <link href="{url}" />\n',
+        f"    <id>{url}</id>\n",
+        f"    <updated>{post['date']:%Y-%m-%dT00:00:00Z}</updated>\n",
+        *(f'    <category term="{xml_escape(tag, {chr(34): "&quot;"})}" />\n' for tag in post["tags"]),
+        f"    <summary>{xml_escape(post['excerpt'])}</summary>\n",
+        f'    <content type="html">{xml_escape(content)}</content>\n',
+        "  </entry>\n",
+    ])
+
+
+def atom_feed(title, path, posts, items):
+    """Stream an Atom feed of posts; items are their atom_item() texts."""
+    updated = posts[0]["date"] if posts else datetime(1970, 1, 1)
+    yield "<?xml version='1.0' encoding='utf-8'?>\n"
+    yield '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+    yield f"  <title>{xml_escape(title)}</title>\n"
+    yield f"  <id>{SITE_URL}/{path}</id>\n"
+    yield f'  <link href="{SITE_URL}/" />\n'
+    yield f'  <link href="{xml_escape(f"{SITE_URL}/{quote(path)}")}" rel="self" />\n'
+    yield f"  <updated>{updated:%Y-%m-%dT00:00:00Z}</updated>\n"
+    yield from items
+    yield "</feed>"
+
+
+def json_item(post, content):
+    """One JSON Feed item; content is the post's full HTML."""
+    url = f"{SITE_URL}/{post['url_slug']}/"
+    return json.dumps({"id": url, "url": url, "title": post["title"], "summary": post["excerpt"],
+                       "content_html": content, "date_published": f"{post['date']:%Y-%m-%dT00:00:00Z}",
+                       "tags": post["tags"]}, ensure_ascii=False)
+
+
+def json_feed(title, path, posts, items):
+    """Stream a JSON Feed 1.1 of posts; items are their json_item() texts."""
+    head = {"version": "https://jsonfeed.org/version/1.1", "title": title,
+            "home_page_url": f"{SITE_URL}/", "feed_url": f"{SITE_URL}/{quote(path)}"}
+    yield json.dumps(head, ensure_ascii=False)[:-1] + ', "items": ['
+    for i, item in enumerate(items):
+        yield ("\n  " if i == 0 else ",\n  ") + item
+    yield "\n]}\n"
+
+
+# Feed file name -> (feed writer, item renderer). Items don't depend on the
+# feed they're in, so each post's are rendered once and shared.
+FEED_FORMATS = {"feed.xml": (rss_feed, rss_item), "atom.xml": (atom_feed, atom_item),
+                "feed.json": (json_feed, json_item)}
+
+
+def listing_outputs(prefix, count):
+    """Outputs of the listing at prefix ("" or "tag/<t>/") holding count
+    posts: its pages, listing.json and feeds."""
+    pages = max(1, -(-count // PAGE_SIZE))
+    return ([f"{prefix}index.html"] + [f"{prefix}page/{n}/index.html" for n in range(2, pages + 1)]
+            + [f"{prefix}listing.json"] + [prefix + name for name in FEED_FORMATS])
+
+
+# Search: static/search.js applies the same normalization to queries
+SEARCH_PREFIX_LEN = 2  # index shards hold all terms sharing this many leading chars
+SEARCH_WEIGHTS = {"title": 5, "tags": 3, "excerpt": 2, "body": 1}
+SEARCH_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc", "\u0649": "\u06cc",  # Arabic yeh / alef maksura -> Persian yeh
+    "\u0643": "\u06a9",  # Arabic kaf -> Persian kaf
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627",  # hamza/madda alefs -> alef
+    "\u0629": "\u0647",  # teh marbuta -> heh
+    "\u200c": " ",  # ZWNJ separates parts of a Persian compound; index them separately
+    "\u0640": None,  # tatweel
+    **{chr(c): None for c in range(0x064B, 0x0660)},  # harakat
+    "\u0670": None,
+    **{chr(0x06F0 + d): str(d) for d in range(10)},  # Persian digits
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+})
+SEARCH_STRIP_RE = re.compile(r"https?://\S+|\]\([^)]*\)|<[^>]+>|(?<![\w/])files/\S+")
+
+
+def search_tokens(text):
+    """Unicode-aware search tokens: NFKC, lowercased, Persian letter forms unified."""
+    text = unicodedata.normalize("NFKC", text).lower().translate(SEARCH_CHAR_MAP)
+    return [t for t in re.findall(r"\w+", text) if 2 <= len(t) <= 40]
+
+
+def post_search_terms(title, excerpt, tags, content):
+    """Map each search term of a post to its field-weighted frequency."""
+    terms = {}
+    fields = {"title": title, "tags": " ".join(tags), "excerpt": excerpt,
+              "body": SEARCH_STRIP_RE.sub(" ", content)}
+    for field, text in fields.items():
+        weight = SEARCH_WEIGHTS[field]
+        for token in search_tokens(text):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def search_shard(term):
+    """Shard file for a term: hex UTF-8 of its prefix, safe in any URL."""
+    return term[:SEARCH_PREFIX_LEN].encode("utf-8").hex()
+
+
+def write_search_index(posts_data, search_posts, previous, graph):
+    """Write the sharded client-side search index under SEARCH_DIR_NAME.
+
+    search_posts maps each post filename to {"hash", "id", "terms"} for this
+    build; previous is the search cache from the last one, postings
+    included. Doc ids are stable across builds, so a rebuild only replaces
+    the postings whose weight changed (every posting of an added or
+    removed post) and re-serializes the shards holding them; the rest keep
+    their recorded digest and are skipped by the build graph. Returns the
+    new search cache."""
+    old_posts = previous.get("posts", {})
+    dirty = set()
+    changed = []  # (old entry or None, new entry or None, terms whose posting differs)
+    for filename in search_posts.keys() | old_posts.keys():
+        new, old = search_posts.get(filename), old_posts.get(filename)
+        if new and old and new["id"] == old["id"]:
+            if new["hash"] == old["hash"]:
+                continue
+            old_terms, new_terms = old["terms"], new["terms"]
+            terms = {t for t in old_terms.keys() | new_terms.keys() if old_terms.get(t) != new_terms.get(t)}
+        else:
+            terms = (old["terms"].keys() if old else set()) | (new["terms"].keys() if new else set())
+        changed.append((old, new, terms))
+        dirty.update(search_shard(t) for t in terms)
+
+    shards = previous.get("postings")  # shard -> term -> [[doc id, weight], ...]
+    if shards is None:
+        # First build (or an older cache): every post's postings go in
+        shards = {}
+        for entry in search_posts.values():
+            for term, weight in entry["terms"].items():
+                shards.setdefault(search_shard(term), {}).setdefault(term, []).append([entry["id"], weight])
+    else:
+        # Copy the shards about to change, so the previous cache stays intact
+        shards = dict(shards)
+        for shard in dirty:
+            shards[shard] = dict(shards.get(shard, {}))
+        for old, new, terms in changed:
+            for term in terms:
+                shard = shards[search_shard(term)]
+                postings = [d for d in shard.get(term, ()) if not old or d[0] != old["id"]]
+                if new and term in new["terms"]:
+                    postings.append([new["id"], new["terms"][term]])
+                if postings:
+                    shard[term] = postings
+                else:
+                    shard.pop(term, None)
+        for shard in dirty:
+            if not shards[shard]:
+                del shards[shard]
+
+    def shard_json(shard):
+        postings = shards[shard]
+        return json.dumps({term: sorted(postings[term], key=lambda d: (-d[1], d[0]))
+                           for term in sorted(postings)}, ensure_ascii=False, separators=(",", ":"))
+
+    old_digests = previous.get("shards", {})
+    digests = {}
+    for shard in sorted(shards):
+        if shard in dirty or shard not in old_digests:
+            text = shard_json(shard)
+            digests[shard] = content_hash(text)
+            render = lambda text=text: text
+        else:
+            digests[shard] = old_digests[shard]
+            if graph.keep(f"{SEARCH_DIR_NAME}/{shard}.json"):
+                continue
+            render = partial(shard_json, shard)
+        graph.build_output(f"{SEARCH_DIR_NAME}/{shard}.json", {"postings": digests[shard]}, render)
+
+    if not graph.keep(f"{SEARCH_DIR_NAME}/docs.json"):
+        docs = {search_posts[p["filename"]]["id"]: [p["url_slug"], p["title"], p["date_str"]]
+                for p in posts_data}
+        docs_json = json.dumps({"prefix_len": SEARCH_PREFIX_LEN, "docs": docs},
+                               ensure_ascii=False, separators=(",", ":"))
+        graph.build_output(f"{SEARCH_DIR_NAME}/docs.json", {"docs": content_hash(docs_json)}, lambda: docs_json)
+
+    next_id = max([previous.get("next_id", 0)] + [e["id"] + 1 for e in search_posts.values()])
+    return {"posts": search_posts, "next_id": next_id, "shards": digests, "postings": shards}
 
 
 def load_comments(url_slug):
@@ -366,6 +1237,7 @@ def load_comments(url_slug):
 
 
 CACHE_FILE = BLOG_DIR / ".build_cache.json"
+CACHE_VERSION = 3
 
 
 def content_hash(text):
@@ -373,21 +1245,604 @@ def content_hash(text):
     return hashlib.md5(text.encode()).hexdigest()
 
 
+def dep_hash(*parts):
+    """Hash build inputs (strings, numbers, dates and lists/tuples of them) into one key."""
+    return content_hash(repr(parts))
+
+
 def load_cache():
     try:
-        return json.loads(CACHE_FILE.read_text())
+        cache = json.loads(CACHE_FILE.read_text())
     except (FileNotFoundError, json.JSONDecodeError):
         return {}
+    # Caches from older build.py versions have a different layout; start over
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache
 
 
 def save_cache(cache):
+    cache["version"] = CACHE_VERSION
     CACHE_FILE.write_text(json.dumps(cache), encoding="utf-8")
 
 
-def build(local=False, force=False, cdn=None):
-    """Main build function. cdn=URL base rewrites files/ paths to external URLs."""
-    cache = {} if force else load_cache()
-    new_cache = {}
+def comments_fingerprint(url_slug):
+    """Hash of a post's comment files, so new or edited comments trigger a re-render."""
+    comment_dir = COMMENTS_DIR / url_slug
+    if not comment_dir.is_dir():
+        return ""
+    return dep_hash([(f.name, content_hash(f.read_text(encoding="utf-8")))
+                     for f in sorted(comment_dir.glob("*.yml"))])
+
+
+class BuildGraph:
+    """Tracks what every generated page was built from.
+
+    Each output (a path relative to SITE_DIR) is registered with a dict of
+    named dependency hashes: post content, sidebar HTML, neighbour links,
+    templates, etc. An output is only re-rendered and rewritten when one of
+    those hashes differs from the previous build, or the file is missing.
+    The reasons are kept so the build can report what changed.
+
+    A --watch rebuild that knows which outputs its edits can reach sets
+    scope to them; keep() then lets every other output go unchecked."""
+
+    def __init__(self, previous, force=False):
+        self.previous = previous
+        self.current = {}
+        self.force = force
+        self.scope = None  # outputs that may have changed, or None for all
+        self.written = {}  # output -> reason
+        self.skipped = []
+
+    def keep(self, output):
+        """True if output is outside scope and was built last time: its
+        previous deps are carried over, and the caller can skip computing
+        them. The file is assumed still in place (--watch wrote it)."""
+        if self.scope is None or output in self.scope:
+            return False
+        old = self.previous.get(output)
+        if old is None:
+            return False
+        self.current[output] = old
+        self.skipped.append(output)
+        return True
+
+    def build_output(self, output, deps, render):
+        """Write render() to SITE_DIR/output unless its deps are unchanged.
+        render returns str, bytes or an iterable of str chunks.
+        Returns True if the file was written."""
+        self.current[output] = deps
+        reason = self._stale_reason(output, deps)
+        if reason is None:
+            self.skipped.append(output)
+            return False
+        path = SITE_DIR / output
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = render()
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        elif isinstance(content, str):
+            path.write_text(content, encoding="utf-8")
+        else:  # an iterable of str chunks (streamed feeds)
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(content)
+        self.written[output] = reason
+        return True
+
+    def _stale_reason(self, output, deps):
+        if self.force:
+            return "forced"
+        old = self.previous.get(output)
+        if old is None:
+            return "new"
+        if not os.path.exists(os.path.join(SITE_DIR, output)):
+            return "missing"
+        changed = sorted(k for k in deps.keys() | old.keys() if deps.get(k) != old.get(k))
+        if changed:
+            return ", ".join(changed)
+        return None
+
+    def prune(self):
+        """Delete outputs from the previous build that are no longer produced
+        (removed posts or tags). Returns the list of removed outputs."""
+        removed = []
+        for output in sorted(self.previous.keys() - self.current.keys()):
+            path = SITE_DIR / output
+            if path.exists():
+                path.unlink()
+                removed.append(output)
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+        return removed
+
+    def report(self, explain=False):
+        """Print a summary of written/skipped outputs and why."""
+        counts = {}
+        for reason in self.written.values():
+            for dep in reason.split(", "):
+                counts[dep] = counts.get(dep, 0) + 1
+        summary = ", ".join(f"{dep} ({n})" for dep, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+        print(f"Pages: {len(self.written)} written, {len(self.skipped)} skipped (inputs unchanged)"
+              + (f"; rebuilt for: {summary}" if summary else ""))
+        if explain:
+            for output, reason in sorted(self.written.items()):
+                print(f"  write {output}: {reason}")
+            for output in sorted(self.skipped):
+                print(f"  skip  {output}: inputs unchanged")
+
+
+def file_hash(path):
+    """MD5 of a file's bytes, read in chunks."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_lfs_pointer(path, size):
+    """True for Git LFS pointer files (small text files starting with "version https://git-lfs")."""
+    if size >= 200:
+        return False
+    try:
+        with open(path, "rb") as f:
+            return f.read(40).startswith(b"version https://git-lfs")
+    except OSError:
+        return False
+
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
+def place_file(src, dst):
+    """Put a copy of src at dst as cheaply as the filesystem allows.
+
+    Tries a reflink (copy-on-write clone), then a hard link, and only falls
+    back to a byte copy when neither works (e.g. across filesystems).
+    Returns "reflinked", "linked" or "copied"."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return "reflinked"
+    except (ImportError, OSError):
+        dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+        return "linked"
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+    return "copied"
+
+
+def sync_assets(assets, manifest, full_prune=True, check=None):
+    """Mirror the referenced files/ assets into SITE_DIR and prune the rest.
+
+    manifest maps each asset to the (size, mtime_ns, hash) of its source at
+    the last sync. Unchanged sources whose output is still in place only cost
+    a stat; a source whose size/mtime moved is re-hashed and only re-placed
+    if its content actually changed. With check, only those assets (and
+    ones not synced before) are looked at; the rest keep their manifest
+    entry. Assets dropped since the last sync are deleted; with full_prune,
+    SITE_DIR/files is also walked for any other unreferenced files.
+    Returns (new_manifest, stats)."""
+    new_manifest = {}
+    stats = {"unchanged": 0, "reflinked": 0, "linked": 0, "copied": 0, "pruned": 0, "missing": 0}
+    for asset in sorted(assets):
+        if check is not None and asset not in check and asset in manifest:
+            new_manifest[asset] = manifest[asset]
+            stats["unchanged"] += 1
+            continue
+        src = asset_source(asset)
+        try:
+            st = os.stat(src)
+        except OSError:
+            stats["missing"] += 1
+            continue
+        if is_lfs_pointer(src, st.st_size):
+            continue
+        dst = os.path.join(SITE_DIR, asset)
+        prev = manifest.get(asset)
+        try:
+            dst_size = os.stat(dst).st_size
+        except OSError:
+            dst_size = None
+        in_place = dst_size == st.st_size
+        if (prev and in_place
+                and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns):
+            new_manifest[asset] = prev
+            stats["unchanged"] += 1
+            continue
+        digest = file_hash(src)
+        if prev and in_place and prev["hash"] == digest:
+            # Touched but not modified (e.g. a fresh git checkout)
+            stats["unchanged"] += 1
+        else:
+            stats[place_file(src, Path(dst))] += 1
+        new_manifest[asset] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+
+    files_out = SITE_DIR / "files"
+    if full_prune and files_out.is_dir():
+        for path in sorted(files_out.rglob("*"), reverse=True):
+            if path.is_dir():
+                if not any(path.iterdir()):
+                    path.rmdir()
+            elif path.relative_to(SITE_DIR).as_posix() not in new_manifest:
+                path.unlink()
+                stats["pruned"] += 1
+    else:
+        for asset in manifest.keys() - new_manifest.keys():
+            path = SITE_DIR / asset
+            if path.exists():
+                path.unlink()
+                stats["pruned"] += 1
+    return new_manifest, stats
+
+
+ASSET_INDEX_FILE = BLOG_DIR / ".asset_index.json"
+ASSET_INDEX_VERSION = 1
+
+
+class AssetIndex:
+    """Which posts reference which files/ assets, kept on disk between runs.
+
+    posts maps each post (path relative to BLOG_DIR) to the (mtime_ns, size)
+    stamp of the source it was scanned from and the sorted assets it
+    references; the reverse map from asset to posts is derived from it on
+    demand. build() records every post it reads; refresh() rescans only the
+    posts whose stamp moved, so scripts get an up-to-date index without a
+    build."""
+
+    def __init__(self, posts=None):
+        self.posts = posts or {}  # relpath -> {"stamp": [mtime_ns, size], "assets": [...]}
+        self.dirty = False
+        self._by_asset = None
+
+    @classmethod
+    def load(cls, path=ASSET_INDEX_FILE):
+        try:
+            data = json.loads(Path(path).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls()
+        if data.get("version") != ASSET_INDEX_VERSION:
+            return cls()
+        return cls(data["posts"])
+
+    def save(self, path=ASSET_INDEX_FILE):
+        """Write the index if anything changed since it was loaded."""
+        if self.dirty:
+            Path(path).write_text(json.dumps({"version": ASSET_INDEX_VERSION, "posts": self.posts},
+                                             indent=1, sort_keys=True), encoding="utf-8")
+            self.dirty = False
+
+    def update(self, relpath, stamp, assets):
+        """Record the assets referenced by one post."""
+        entry = {"stamp": list(stamp), "assets": sorted(assets)}
+        if self.posts.get(relpath) != entry:
+            if self.posts.get(relpath, {}).get("assets") != entry["assets"]:
+                self._by_asset = None
+            self.posts[relpath] = entry
+            self.dirty = True
+
+    def retain(self, relpaths):
+        """Forget posts not in relpaths (deleted or renamed since they were indexed)."""
+        for relpath in self.posts.keys() - set(relpaths):
+            del self.posts[relpath]
+            self.dirty = True
+            self._by_asset = None
+
+    def refresh(self):
+        """Bring the index up to date with posts/ on disk. Returns the number of posts rescanned."""
+        rescanned = 0
+        relpaths = []
+        for path in sorted(BLOG_DIR.glob("posts/*/*.md")):
+            if parse_filename(path.name)[0] is None:
+                continue
+            relpath = path.relative_to(BLOG_DIR).as_posix()
+            relpaths.append(relpath)
+            st = path.stat()
+            entry = self.posts.get(relpath)
+            if entry and entry["stamp"] == [st.st_mtime_ns, st.st_size]:
+                continue
+            self.update(relpath, (st.st_mtime_ns, st.st_size), post_assets(path.read_text(encoding="utf-8")))
+            rescanned += 1
+        self.retain(relpaths)
+        return rescanned
+
+    def by_asset(self):
+        """{asset: [posts referencing it]}."""
+        if self._by_asset is None:
+            self._by_asset = {}
+            for relpath, entry in sorted(self.posts.items()):
+                for asset in entry["assets"]:
+                    self._by_asset.setdefault(asset, []).append(relpath)
+        return self._by_asset
+
+    def posts_for(self, asset):
+        """Posts referencing asset (a "files/..." path)."""
+        return self.by_asset().get(asset, [])
+
+    def missing(self):
+        """{asset: posts} for referenced assets with no file behind them."""
+        return {asset: posts for asset, posts in self.by_asset().items()
+                if not (BLOG_DIR / asset).is_file()}
+
+    def orphans(self):
+        """Files under files/ that no post references. Generated thumbnails
+        and image variants are not counted; the build tracks those itself."""
+        referenced = self.by_asset()
+        orphans = []
+        for path in sorted(FILES_DIR.rglob("*")):
+            asset = path.relative_to(BLOG_DIR).as_posix()
+            if path.is_file() and not is_generated(asset) and asset not in referenced:
+                orphans.append(path)
+        return orphans
+
+
+def asset_report():
+    """Print referenced assets that don't exist and files/ entries no post uses."""
+    index = AssetIndex.load()
+    rescanned = index.refresh()
+    index.save()
+    print(f"Asset index: {len(index.posts)} posts ({rescanned} rescanned), "
+          f"{len(index.by_asset())} referenced assets")
+
+    missing = index.missing()
+    print(f"\nMissing ({len(missing)}):")
+    for asset, posts in sorted(missing.items()):
+        print(f"  {asset}")
+        for post in posts:
+            print(f"    <- {post}")
+
+    orphans = index.orphans()
+    size = sum(path.stat().st_size for path in orphans)
+    print(f"\nOrphaned ({len(orphans)}, {size / 1e6:.1f} MB):")
+    for path in orphans:
+        print(f"  {path.relative_to(BLOG_DIR).as_posix()}")
+
+
+class BuildState:
+    """Parsed build inputs kept in memory between builds.
+
+    A one-off build starts from an empty state. --watch keeps one alive so a
+    rebuild only re-reads files whose mtime or size changed: templates,
+    tags.yml and each post's metadata are memoized by file stamp, the static
+    fingerprinting is skipped when static/ is untouched, feed items are kept
+    until their post changes, and the build cache stays loaded instead of
+    being re-read from disk.
+
+    --watch also sets changed to the paths its watcher reported since the
+    last build. Files outside it are then taken from memory without a stat,
+    and an edit to existing posts only checks the outputs and assets those
+    posts can reach (see _build)."""
+
+    def __init__(self, livereload_port=None, save_cache=True):
+        self.cache = None
+        self.static_stamp = None
+        self.static_files = {}  # fingerprint_static() for static_stamp
+        self.asset_index = None
+        self.feed_items = {}  # (feed name, slug) -> (feed key, cdn, item text)
+        self.comments = {}  # slug -> comments_fingerprint()
+        self.changed = None  # paths changed since the last build, when known
+        self.livereload_port = livereload_port
+        self.save_cache = save_cache  # False: caller saves state.cache when done
+        self._files = {}  # path -> (stamp, value)
+
+    def read(self, path, parse=None):
+        """Return parse(text) for path (or the text itself), re-reading and
+        re-parsing only when the file's mtime/size changed since last time
+        (or, when changed is known, only when path is in it)."""
+        hit = self._files.get(path)
+        if hit and self.changed is not None and path not in self.changed:
+            return hit[1]
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if hit and hit[0] == stamp:
+            return hit[1]
+        text = path.read_text(encoding="utf-8")
+        value = parse(text) if parse else text
+        self._files[path] = (stamp, value)
+        return value
+
+    def stamp(self, path):
+        """(mtime_ns, size) of path as of its last read()."""
+        return self._files[path][0]
+
+
+def tree_stamp(root):
+    """(path, mtime, size) of every file under root; changes when any file does."""
+    return sorted(
+        (str(p.relative_to(root)), p.stat().st_mtime_ns, p.stat().st_size)
+        for p in root.rglob("*") if p.is_file()
+    )
+
+
+def fingerprint_static():
+    """Content-addressed copies of static/, with the Pygments CSS appended to
+    style.css. Returns {"static/<name>": ("static/<stem>.<hash><ext>", bytes)};
+    since a file's name changes with its content, pages referencing it can
+    be cached indefinitely."""
+    files = {}
+    for src in sorted(STATIC_DIR.rglob("*")):
+        if not src.is_file():
+            continue
+        data = src.read_bytes()
+        rel = src.relative_to(STATIC_DIR).as_posix()
+        if rel == "style.css":
+            data += f"\n{generate_pygments_css()}".encode("utf-8")
+        stem, dot, ext = rel.rpartition(".")
+        hashed = f"{stem}.{hashlib.md5(data).hexdigest()[:10]}.{ext}" if dot else f"{rel}.{hashlib.md5(data).hexdigest()[:10]}"
+        files[f"static/{rel}"] = (f"static/{hashed}", data)
+    return files
+
+
+def rewrite_static_urls(text, static_urls):
+    """Point quoted static/ references at their fingerprinted names."""
+    return re.sub(r'(?<=["\'])static/[^"\']+(?=["\'])',
+                  lambda m: static_urls.get(m.group(0), m.group(0)), text)
+
+
+def precompress(outputs, changed, manifest, enabled=True):
+    """Write .gz (and, with brotli installed, .br) siblings of text outputs.
+
+    manifest maps each output to the hash of the content its siblings were
+    made from. Outputs not in changed whose .gz is in place are trusted
+    without reading them; the rest are hashed and recompressed only when the
+    hash moved. Siblings of outputs that are gone or too small are removed.
+    With enabled=False nothing is compressed, but siblings that would be
+    stale are still removed. Returns (new_manifest, recompressed_count)."""
+    if not enabled and not manifest:
+        return {}, 0  # nothing compressed before, nothing to do now
+    new_manifest = {}
+    count = 0
+    sibling_exts = (".gz", ".br") if HAS_BROTLI else (".gz",)
+    for output in sorted(outputs):
+        if os.path.splitext(output)[1] not in COMPRESS_SUFFIXES:
+            continue
+        path = os.path.join(SITE_DIR, output)
+        if output in manifest and output not in changed and os.path.exists(path + ".gz"):
+            new_manifest[output] = manifest[output]
+            continue
+        if not enabled:
+            continue
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if len(data) < COMPRESS_MIN_SIZE:
+            continue
+        digest = hashlib.md5(data).hexdigest()
+        new_manifest[output] = digest
+        if manifest.get(output) == digest and all(os.path.exists(path + e) for e in sibling_exts):
+            continue
+        with open(path + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if HAS_BROTLI:
+            with open(path + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=BROTLI_QUALITY))
+        count += 1
+    for output in manifest.keys() - new_manifest.keys():
+        for ext in (".gz", ".br"):
+            try:
+                os.remove(os.path.join(SITE_DIR, output + ext))
+            except FileNotFoundError:
+                pass
+    return new_manifest, count
+
+
+def write_post_pages(posts_data, graph, base_tmpl, tag_sidebar_html,
+                     timeline_sidebar_html, cdn=None):
+    """Fill in prev/next links and write each post page into SITE_DIR.
+
+    posts_data is sorted newest-first, so i-1 = newer, i+1 = older. Each page
+    depends on the rendered post, its neighbour links, both sidebars and the
+    base template; graph skips pages where none of those changed.
+    Returns (written_count, skipped_count)."""
+    common = {
+        "sidebar": content_hash(tag_sidebar_html),
+        "timeline": content_hash(timeline_sidebar_html),
+        "template": content_hash(base_tmpl),
+        "cdn": cdn or "",
+    }
+    written_count = 0
+    skipped_count = 0
+    for i, p in enumerate(posts_data):
+        if graph.keep(f'{p["url_slug"]}/index.html'):
+            skipped_count += 1
+            continue
+        if i > 0:
+            nxt = posts_data[i - 1]
+            next_link = (
+                f'<a href="{nxt["url_slug"]}/" class="post-nav-next">'
+                f'<span class="post-nav-label">newer ▶</span>'
+                f'<span class="post-nav-title">{html.escape(nxt["title"])}</span></a>'
+            )
+        else:
+            next_link = ""
+
+        if i < len(posts_data) - 1:
+            prv = posts_data[i + 1]
+            prev_link = (
+                f'<a href="{prv["url_slug"]}/" class="post-nav-prev">'
+                f'<span class="post-nav-label">◀ older</span>'
+                f'<span class="post-nav-title">{html.escape(prv["title"])}</span></a>'
+            )
+        else:
+            prev_link = ""
+
+        def render(p=p, prev_link=prev_link, next_link=next_link):
+            with span("page template"):
+                post_content = p["post_html"].replace("{{prev_link}}", prev_link).replace("{{next_link}}", next_link)
+                if cdn:
+                    post_content = rewrite_cdn_urls(post_content, cdn)
+                return render_template(base_tmpl, title=p["title"], content=post_content, sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html)
+
+        deps = dict(common, post=content_hash(p["post_html"]), nav=content_hash(prev_link + next_link))
+        with span("page", post=p["url_slug"]):
+            written = graph.build_output(f'{p["url_slug"]}/index.html', deps, render)
+        if written:
+            written_count += 1
+        else:
+            skipped_count += 1
+
+    return written_count, skipped_count
+
+
+def build(local=False, force=False, cdn=None, jobs=None, explain=False, state=None,
+          profile=None, compress=False):
+    """Main build function. cdn=URL base rewrites files/ paths to external URLs.
+    jobs>1 renders changed posts in a process pool of that many workers.
+    Thumbnails and image variants are encoded in a pool of jobs workers, or
+    one per CPU when jobs is None (posts then render serially).
+    explain=True lists every output page with the reason it was written or skipped.
+    state is a BuildState to reuse parsed inputs across calls (--watch).
+    profile=PATH records per-stage and per-post timings and allocations,
+    prints a summary and writes a Chrome trace to PATH.
+    compress=True writes .gz/.br siblings of changed text outputs."""
+    global _profiler
+    if profile:
+        _profiler = Profiler()
+    try:
+        _build(local, force, cdn, jobs, explain, state, profile, compress)
+    finally:
+        _profiler = None
+
+
+def _build(local, force, cdn, jobs, explain, state, profile, compress):
+    profile_stage("setup")
+    encode_jobs = jobs or os.cpu_count() or 1
+    jobs = jobs or 1
+    if state is None:
+        state = BuildState()
+    if force:
+        cache = {}
+    elif state.cache is not None:
+        cache = state.cache
+    else:
+        cache = load_cache()
+    cached_posts = cache.get("posts", {})
+    new_posts = {}
+    graph = BuildGraph(cache.get("outputs", {}), force=force)
+
+    # --watch knows what changed since the last build. When that is only
+    # edits to existing posts, the rest of the site can trust the previous
+    # build: only the edited posts' assets are stat'ed, and (if both
+    # sidebars come out the same) only the outputs they can reach are checked.
+    changed = state.changed if state.cache is not None and not force else None
+    state.changed = changed
+    posts_dir = BLOG_DIR / "posts"
+    edited = None  # filenames of the edited posts, for a posts-only change
+    if changed and all(p.suffix == ".md" and p.parent.parent == posts_dir and p.exists() for p in changed):
+        edited = {p.name for p in changed}
 
     # Don't wipe _site/ — keep existing files for incremental builds
     SITE_DIR.mkdir(parents=True, exist_ok=True)
@@ -408,119 +1863,119 @@ def build(local=False, force=False, cdn=None):
     # Build slug map for cross-references
     slug_map = build_slug_map(posts)
 
+    # Fingerprint static files (style.css gets the Pygments CSS appended)
+    profile_stage("static")
+    if changed is None or any(STATIC_DIR in p.parents for p in changed):
+        static_stamp = tree_stamp(STATIC_DIR)
+        if static_stamp != state.static_stamp:
+            state.static_files = fingerprint_static()
+            state.static_stamp = static_stamp
+    static_urls = {}
+    for rel, (hashed, data) in state.static_files.items():
+        static_urls[rel] = hashed
+        graph.build_output(hashed, {}, lambda data=data: data)
+
     # Load templates
-    base_tmpl = load_template("base.html")
+    def load(name):
+        return rewrite_static_urls(state.read(TEMPLATE_DIR / name), static_urls)
+
+    base_tmpl = load("base.html")
     if local:
         base_tmpl = base_tmpl.replace('<base href="/notes/blog/">', '<base href="/">')
-    post_tmpl = load_template("post.html")
-    index_tmpl = load_template("index.html")
-
-    # Generate Pygments CSS
-    pygments_css = generate_pygments_css()
-
-    # Copy static files and append Pygments CSS to style.css
-    static_out = SITE_DIR / "static"
-    if static_out.exists():
-        shutil.rmtree(static_out)
-    shutil.copytree(STATIC_DIR, static_out)
-    with open(static_out / "style.css", "a") as f:
-        f.write(f"\n{pygments_css}")
+    if state.livereload_port:
+        base_tmpl = base_tmpl.replace("</body>", livereload_snippet(state.livereload_port) + "</body>")
+    post_tmpl = load("post.html")
+    index_tmpl = load("index.html")
+    post_tmpl_hash = content_hash(post_tmpl)
 
     # Process posts — two-pass: fast metadata, then expensive rendering only if changed
-    all_assets = set()
+    profile_stage("metadata")
+    if state.asset_index is None or force:
+        state.asset_index = AssetIndex() if force else AssetIndex.load()
+    asset_index = state.asset_index
     posts_data = []
     rendered_count = 0
     cached_count = 0
 
-    for relpath, filename, date, slug, url_slug in posts:
-        filepath = BLOG_DIR / relpath
-        raw = filepath.read_text(encoding="utf-8")
-        raw_hash = content_hash(raw)
-
-        # Parse frontmatter (fast)
-        meta, body = parse_frontmatter(raw)
+    render_jobs = []  # (index into posts_data, render_post args)
+    search_cache = cache.get("search", {})
+    search_posts = {}  # filename -> {"hash", "id", "terms"}; ids stay stable across builds
+    next_search_id = search_cache.get("next_id", 0)
+    thumb_jobs = []  # (index into posts_data, source image)
+    edited_assets = set()  # files/ assets and thumbnails of the edited posts
+    if edited and {filename for _relpath, filename, *_rest in posts} != cached_posts.keys():
+        edited = None  # a post was added after all
+
+    def trusted(source, entries):
+        """Cached stat entry for a source a posts-only rebuild needn't check
+        (files/ isn't watched, and no edited post uses it), or None."""
+        if edited is None or source in edited_assets:
+            return None
+        return entries.get(source)
 
-        # Extract title (fast)
-        title = meta.get("title")
-        title_anchor = None
-        if title:
-            content = body
+    for relpath, filename, date, slug, url_slug in posts:
+        # Fast metadata pass: frontmatter, title, excerpt, tags (memoized by mtime in --watch)
+        with span("metadata", post=url_slug):
+            post = state.read(BLOG_DIR / relpath, parse_post)
+        raw_hash = post["hash"]
+        title = post["title"]
+        title_anchor = post["title_anchor"]
+        content = post["content"]
+        excerpt = post["excerpt"]
+        tags = post["tags"]
+        thumbnail = post["thumbnail"]
+        if not edited or filename in edited:  # the rest haven't moved since they were recorded
+            asset_index.update(relpath.as_posix(), state.stamp(BLOG_DIR / relpath), post["assets"])
+        if edited and filename in edited:
+            edited_assets.update(post["assets"])
+            if thumbnail:
+                edited_assets.add(thumbnail)
+
+        # Photoblog thumbnails are generated in their own stage below
+        if thumbnail and "photoblog" in tags and (
+                trusted(thumbnail, cache.get("thumbs", {})) or (BLOG_DIR / thumbnail).exists()):
+            thumb_jobs.append((len(posts_data), thumbnail))
+
+        # Search terms only change with the post source
+        prev_search = search_cache.get("posts", {}).get(filename)
+        if prev_search and prev_search["hash"] == raw_hash:
+            search_posts[filename] = prev_search
         else:
-            title, content, title_anchor = extract_title(body)
-
-        # Extract excerpt (fast)
-        excerpt = extract_excerpt(content)
-
-        # Parse tags (fast)
-        tags = []
-        raw_tags = meta.get("tags", "")
-        if raw_tags:
-            tags = [t.strip().lower() for t in raw_tags.split(",") if t.strip()]
-
-        thumbnail = meta.get("thumbnail", "")
-
-        # Generate thumbnails (cached by mtime already)
-        if thumbnail and "photoblog" in tags:
-            src_img = BLOG_DIR / thumbnail
-            if src_img.exists():
-                thumb_name = Path(thumbnail).stem + ".png"
-                thumb_rel = f"files/{THUMB_DIR_NAME}/{thumb_name}"
-                thumb_path = BLOG_DIR / thumb_rel
-                if generate_thumbnail(src_img, thumb_path):
-                    thumbnail = thumb_rel
-                    all_assets.add(thumb_rel)
-
-        # Check cache — skip expensive rendering if unchanged
-        cached_entry = cache.get(filename)
-        post_dir = SITE_DIR / url_slug
-        post_html_path = post_dir / "index.html"
-
-        if (cached_entry
-                and cached_entry.get("hash") == raw_hash
-                and post_html_path.exists()
-                and not force):
-            # Use cached post — still need post_html placeholder for prev/next rewriting later
-            post_html = cached_entry.get("post_html", "")
-            cached_count += 1
+            if prev_search:
+                search_id = prev_search["id"]
+            else:
+                search_id, next_search_id = next_search_id, next_search_id + 1
+            search_posts[filename] = {
+                "hash": raw_hash, "id": search_id,
+                "terms": post_search_terms(title, excerpt, tags, content),
+            }
+
+        # Check cache — skip expensive rendering if nothing the render reads changed
+        cached_entry = cached_posts.get(filename)
+        if edited and filename not in edited:
+            # Same source, templates, comments and slugs as last time
+            render_key = cached_entry["render_key"]
         else:
-            # Expensive: convert embeds, rewrite links, render markdown, load comments
-            content = convert_embeds(content)
-            content = convert_media_links(content)
-            content = rewrite_github_links(content, slug_map)
-
-            for match in re.finditer(r'(?<![a-z/])files/([^"\')\s]+)', content):
-                all_assets.add(f"files/{match.group(1)}")
-
-            body_html = add_target_blank(render_markdown(content))
-            body_html = fix_fragment_links(body_html, url_slug)
-            comments_html = load_comments(url_slug)
-
-            tag_chips_html = ""
-            if tags:
-                chips = " ".join(
-                    f'<a href="tag/{t}/" class="tag">{html.escape(t)}</a>' for t in tags
-                )
-                tag_chips_html = f'<span class="tag-chips">{chips}</span>'
-
-            date_str_full = date.strftime("%B %d, %Y")
-            title_id_attr = f' id="{title_anchor}"' if title_anchor else ""
-            post_html = render_template(
-                post_tmpl, title=title, date=date_str_full, body=body_html,
-                comments=comments_html, comment_endpoint=COMMENT_ENDPOINT,
-                post_slug=url_slug, tag_chips=tag_chips_html,
-                title_id_attr=title_id_attr,
+            if edited is None or url_slug not in state.comments:
+                state.comments[url_slug] = comments_fingerprint(url_slug)
+            render_key = dep_hash(
+                raw_hash, post_tmpl_hash, state.comments[url_slug],
+                [(fn, slug_map.get(fn)) for fn in GITHUB_LINK_RE.findall(content)],
             )
-            rendered_count += 1
-
-        # Find assets from raw content (fast, no markdown needed)
-        for match in re.finditer(r'(?<![a-z/])files/([^"\')\s]+)', raw):
-            all_assets.add(f"files/{match.group(1)}")
 
         date_str = date.strftime("%B %d, %Y")
 
-        new_cache[filename] = {"hash": raw_hash, "post_html": post_html}
+        if cached_entry and cached_entry.get("render_key") == render_key:
+            post_html, body_html = cached_entry["post_html"], cached_entry["body_html"]
+            cached_count += 1
+        else:
+            post_html = body_html = None
+            render_jobs.append((len(posts_data), (content, url_slug, title, title_anchor, date, tags)))
+
+        new_posts[filename] = {"render_key": render_key, "post_html": post_html, "body_html": body_html}
 
         posts_data.append({
+            "filename": filename,
             "title": title,
             "date": date,
             "date_str": date_str,
@@ -529,9 +1984,133 @@ def build(local=False, force=False, cdn=None):
             "tags": tags,
             "thumbnail": thumbnail,
             "post_html": post_html,
+            "body_html": body_html,
         })
 
+    asset_index.retain(relpath.as_posix() for relpath, *_rest in posts)
+    all_assets = set(asset_index.by_asset())
+
+    # Thumbnails: keyed by source content hash (re-hashed only when size/mtime
+    # move), generated in a pool of encode workers.
+    profile_stage("thumbnails")
+    thumb_keys, new_thumb_sources = {}, {}
+    for _idx, src in thumb_jobs:
+        if src not in thumb_keys:
+            prev = cache.get("thumbs", {}).get(src)
+            if trusted(src, cache.get("thumbs", {})):
+                new_thumb_sources[src] = prev
+                thumb_keys[src] = prev["hash"]
+                continue
+            st = os.stat(BLOG_DIR / src)
+            if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+                digest = prev["hash"]
+            else:
+                digest = file_hash(BLOG_DIR / src)
+            new_thumb_sources[src] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            thumb_keys[src] = digest
+    owners = {src: posts_data[idx]["url_slug"] for idx, src in reversed(thumb_jobs)}
+    on_disk = existing_variants()
+    thumbs_ready = {src for src, key in thumb_keys.items() if on_disk.issuperset(thumbnail_variants(key))}
+    pending = [src for src in thumb_keys if src not in thumbs_ready]
+    if encode_jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=encode_jobs) as pool:
+            done = list(pool.map(generate_thumbnails, [BLOG_DIR / src for src in pending],
+                                 [thumb_keys[src] for src in pending]))
+    else:
+        done = []
+        for src in pending:
+            with span("thumbnail", post=owners[src]):
+                done.append(generate_thumbnails(BLOG_DIR / src, thumb_keys[src]))
+    thumbs_ready.update(src for src, ok in zip(pending, done) if ok)
+    for idx, src in thumb_jobs:
+        if src in thumbs_ready:
+            variants = thumbnail_variants(thumb_keys[src])
+            posts_data[idx]["thumbnail"] = variants[0]
+            all_assets.update(variants)
+
+    # Expensive: render changed posts, in a process pool when --jobs > 1.
+    # Results are collected in submission order so the output is identical
+    # to a serial build.
+    profile_stage("render")
+    render = partial(render_post, post_tmpl=post_tmpl, slug_map=slug_map, profile=bool(profile))
+    job_args = [args for _idx, args in render_jobs]
+    if jobs > 1 and len(render_jobs) > 1:
+        workers = min(jobs, len(render_jobs))
+        chunksize = max(1, len(render_jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render, *zip(*job_args), chunksize=chunksize))
+    else:
+        results = [render(*args) for args in job_args]
+    md_timings = {}
+    for (idx, _args), (post_html, body_html, prof) in zip(render_jobs, results):
+        if prof:
+            for stage, secs in prof["timings"].items():
+                md_timings[stage] = md_timings.get(stage, 0.0) + secs
+            _profiler.events.extend(prof["events"])
+        posts_data[idx]["post_html"] = post_html
+        posts_data[idx]["body_html"] = body_html
+        new_posts[posts_data[idx]["filename"]].update(post_html=post_html, body_html=body_html)
+        rendered_count += 1
+
+    # Responsive images: every raster image a post references is probed once
+    # per content hash (cached by size/mtime) for its displayed size; JPEG/PNG
+    # get width variants in AVIF/WebP/their own format, generated in a
+    # pool of encode workers. Post pages are then rewritten with
+    # srcset/sizes, width/height and lazy loading; the cached post_html
+    # stays unrewritten so a new variant never needs a re-render.
+    profile_stage("images")
+    images, new_image_sources = {}, {}
+    for asset in sorted(all_assets):
+        suffix = os.path.splitext(asset)[1].lower()
+        if is_generated(asset) or suffix not in RESPONSIVE_SOURCES and suffix not in (".gif", ".webp"):
+            continue
+        path = BLOG_DIR / asset
+        prev = trusted(asset, cache.get("images", {}))
+        if prev:
+            st = None
+        else:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            prev = cache.get("images", {}).get(asset)
+        if st and not (prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns):
+            probe = probe_image(path)
+            if probe is None:
+                continue
+            prev = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": file_hash(path),
+                    "width": probe[0], "height": probe[1], "responsive": probe[2]}
+        new_image_sources[asset] = prev
+        images[asset] = {"width": prev["width"], "height": prev["height"],
+                         "fallback": RESPONSIVE_SOURCES.get(suffix)}
+    image_jobs = {}  # content hash -> generate_responsive args
+    for asset, entry in new_image_sources.items():
+        if entry["responsive"]:
+            image_jobs.setdefault(entry["hash"], (BLOG_DIR / asset, entry["hash"], entry["width"],
+                                                  entry["height"], images[asset]["fallback"]))
+    variants = {key: responsive_variants(key, width, fallback)
+                for _src, key, width, _height, fallback in image_jobs.values()}
+    images_ready = {key for key in image_jobs if on_disk.issuperset(variants[key])}
+    pending = [args for key, args in image_jobs.items() if key not in images_ready]
+    if encode_jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=encode_jobs) as pool:
+            done = list(pool.map(generate_responsive, *zip(*pending)))
+    else:
+        done = []
+        for args in pending:
+            with span("responsive"):
+                done.append(generate_responsive(*args))
+    images_ready.update(args[1] for args, ok in zip(pending, done) if ok)
+    if pending:
+        print(f"Generated responsive variants for {len(pending)} images")
+    for asset, entry in new_image_sources.items():
+        key = entry["hash"]
+        if entry["responsive"] and key in images_ready:
+            images[asset]["key"] = key
+            all_assets.update(variants[key])
+
     # Build tag map
+    profile_stage("sidebars")
     tag_map = {}
     for p in posts_data:
         for tag in p["tags"]:
@@ -599,7 +2178,7 @@ def build(local=False, force=False, cdn=None):
     if tag_map:
         hierarchy = {}
         if tags_yml_path.exists():
-            hierarchy = yaml.safe_load(tags_yml_path.read_text(encoding="utf-8")) or {}
+            hierarchy = state.read(tags_yml_path, yaml.safe_load) or {}
 
         # Collect all tags claimed by the hierarchy
         for parent, children in hierarchy.items():
@@ -702,60 +2281,43 @@ def build(local=False, force=False, cdn=None):
         '</aside>'
     ) if timeline_parts else ""
 
-    # Write post pages (deferred so sidebar is available)
-    # posts_data is sorted newest-first, so i-1 = newer, i+1 = older
-    written_count = 0
-    skipped_count = 0
-    for i, p in enumerate(posts_data):
-        # Newer post (previous in list order)
-        prev_slug = posts_data[i + 1]["url_slug"] if i < len(posts_data) - 1 else ""
-        next_slug = posts_data[i - 1]["url_slug"] if i > 0 else ""
-
-        if i > 0:
-            nxt = posts_data[i - 1]
-            next_link = (
-                f'<a href="{nxt["url_slug"]}/" class="post-nav-next">'
-                f'<span class="post-nav-label">newer ▶</span>'
-                f'<span class="post-nav-title">{html.escape(nxt["title"])}</span></a>'
-            )
-        else:
-            next_link = ""
-
-        if i < len(posts_data) - 1:
-            prv = posts_data[i + 1]
-            prev_link = (
-                f'<a href="{prv["url_slug"]}/" class="post-nav-prev">'
-                f'<span class="post-nav-label">◀ older</span>'
-                f'<span class="post-nav-title">{html.escape(prv["title"])}</span></a>'
-            )
-        else:
-            prev_link = ""
+    # Each tag's listing includes its descendant tags' posts, newest first
+    tag_listings = {}
+    for tag, tag_posts in tag_map.items():
+        all_posts = list(tag_posts)
+        if tag in descendant_map:
+            seen = {p["url_slug"] for p in all_posts}
+            for desc_tag in sorted(descendant_map[tag]):
+                for p in tag_map.get(desc_tag, []):
+                    if p["url_slug"] not in seen:
+                        all_posts.append(p)
+                        seen.add(p["url_slug"])
+            all_posts.sort(key=lambda p: p["date"], reverse=True)
+        tag_listings[tag] = all_posts
+
+    # With both sidebars unchanged, edits to existing posts can only reach
+    # their own pages, their neighbours' (prev/next titles), and the
+    # listings and feeds they appear in. Search shards scope themselves.
+    previous_index = graph.previous.get("index.html", {})
+    if (edited and previous_index.get("sidebar") == content_hash(tag_sidebar_html)
+            and previous_index.get("timeline") == content_hash(timeline_sidebar_html)):
+        graph.scope = set()
+        for i, p in enumerate(posts_data):
+            if p["filename"] in edited:
+                graph.scope.update(f'{q["url_slug"]}/index.html' for q in posts_data[max(0, i - 1):i + 2])
+        for prefix, listing in [("", posts_data)] + [(f"tag/{t}/", l) for t, l in tag_listings.items()]:
+            if any(p["filename"] in edited for p in listing):
+                graph.scope.update(listing_outputs(prefix, len(listing)))
 
-        # Check if we can skip writing this post
-        post_dir = SITE_DIR / p["url_slug"]
-        post_html_path = post_dir / "index.html"
-        fn = [k for k, v in new_cache.items() if v.get("post_html") == p["post_html"]]
-        fn_key = fn[0] if fn else ""
-        cached_entry = cache.get(fn_key, {}) if fn_key else {}
-        if (not force
-                and post_html_path.exists()
-                and cached_entry.get("prev_slug") == prev_slug
-                and cached_entry.get("next_slug") == next_slug
-                and cached_entry.get("hash") == new_cache.get(fn_key, {}).get("hash")):
-            skipped_count += 1
-        else:
-            post_content = p["post_html"].replace("{{prev_link}}", prev_link).replace("{{next_link}}", next_link)
-            if cdn:
-                post_content = rewrite_cdn_urls(post_content, cdn)
-            page_html = render_template(base_tmpl, title=p["title"], content=post_content, sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html)
-            post_dir.mkdir(parents=True, exist_ok=True)
-            (post_dir / "index.html").write_text(page_html, encoding="utf-8")
-            written_count += 1
+    for p in posts_data:
+        if graph.scope is None or f'{p["url_slug"]}/index.html' in graph.scope:
+            p["post_html"] = responsive_media(p["post_html"], images)
 
-        # Update cache with neighbor info
-        if fn_key:
-            new_cache[fn_key]["prev_slug"] = prev_slug
-            new_cache[fn_key]["next_slug"] = next_slug
+    # Write post pages (deferred so sidebar is available)
+    profile_stage("post pages")
+    written_count, skipped_count = write_post_pages(
+        posts_data, graph, base_tmpl, tag_sidebar_html, timeline_sidebar_html, cdn=cdn,
+    )
 
     def make_tag_chips(tags):
         """Generate tag chip HTML for a post listing."""
@@ -766,19 +2328,18 @@ def build(local=False, force=False, cdn=None):
         )
         return f'<span class="tag-chips">{chips}</span>'
 
-    def make_post_list(post_list, page_size=None):
+    def make_post_list(post_list):
         """Generate <li> items for a list of posts."""
         items = []
-        for i, p in enumerate(post_list):
+        for p in post_list:
             excerpt_html = f'<p class="post-excerpt">{html.escape(p["excerpt"])}</p>' if p["excerpt"] else ""
             chips_html = make_tag_chips(p["tags"])
             thumb = p.get("thumbnail", "")
-            thumb_html = f'<img class="post-thumbnail" src="{html.escape(thumb)}" alt="" loading="lazy">' if thumb else ""
-            hidden = ' hidden' if page_size and i >= page_size else ''
+            thumb_html = thumbnail_html(thumb) if thumb else ""
             date_y = p["date"].strftime("%Y")
             date_ym = p["date"].strftime("%Y-%m")
             items.append(
-                f'  <li{hidden} data-year="date-{date_y}" data-month="date-{date_ym}">\n'
+                f'  <li data-year="date-{date_y}" data-month="date-{date_ym}">\n'
                 f'    <a href="{p["url_slug"]}/" target="_blank" rel="noopener">\n'
                 f'      <span class="post-title">{html.escape(p["title"])}</span>\n'
                 f'      {thumb_html}\n'
@@ -790,79 +2351,410 @@ def build(local=False, force=False, cdn=None):
             )
         return "\n".join(items)
 
-    # Generate index page
-    PAGE_SIZE = 10
-    index_content = render_template(
-        index_tmpl,
-        posts=make_post_list(posts_data, page_size=PAGE_SIZE),
-    )
-    index_html = render_template(base_tmpl, title="Blog", content=index_content, sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html)
-    if cdn:
-        index_html = rewrite_cdn_urls(index_html, cdn)
-    (SITE_DIR / "index.html").write_text(index_html, encoding="utf-8")
+    # Listing pages depend on what make_post_list shows for each post
+    listing_keys = {
+        p["url_slug"]: dep_hash(p["url_slug"], p["title"], p["date_str"], p["excerpt"], p["tags"], p["thumbnail"])
+        for p in posts_data
+    }
+    page_deps = {
+        "sidebar": content_hash(tag_sidebar_html),
+        "timeline": content_hash(timeline_sidebar_html),
+        "cdn": cdn or "",
+    }
+
+    template_deps = {}  # listing template -> dep_hash(base_tmpl, it)
+
+    def build_listing(prefix, post_list, title, tmpl, **tmpl_vars):
+        """Write a paginated post listing rooted at prefix ("" or "tag/<t>/").
+
+        Page 1 is prefix/index.html and page N is prefix/page/N/index.html,
+        each holding at most PAGE_SIZE posts, so a listing's first paint stays
+        the same size however many posts it has. prefix/listing.json tells
+        the infinite-scroll script how many pages there are and which page
+        each month starts on. Returns the number of pages written."""
+        page_count = max(1, -(-len(post_list) // PAGE_SIZE))
+        if tmpl not in template_deps:
+            template_deps[tmpl] = dep_hash(base_tmpl, tmpl)
+        written = 0
+        for page in range(1, page_count + 1):
+            output = f"{prefix}index.html" if page == 1 else f"{prefix}page/{page}/index.html"
+            if graph.keep(output):
+                continue
+            chunk = post_list[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+            def render_page(chunk=chunk, page=page):
+                content = render_template(
+                    tmpl, **tmpl_vars, posts=make_post_list(chunk),
+                    manifest=f"{prefix}listing.json", page=page,
+                    pager=make_pager(prefix, page, page_count),
+                )
+                page_html = render_template(base_tmpl, title=title, content=content, sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html)
+                if cdn:
+                    page_html = rewrite_cdn_urls(page_html, cdn)
+                return page_html
+
+            written += graph.build_output(output, dict(
+                page_deps,
+                posts=dep_hash([listing_keys[p["url_slug"]] for p in chunk]),
+                pager=dep_hash(page, page_count),
+                template=template_deps[tmpl],
+            ), render_page)
+
+        if graph.keep(f"{prefix}listing.json"):
+            return written
+        months = {}
+        for i, p in enumerate(post_list):
+            months.setdefault(p["date"].strftime("%Y-%m"), i // PAGE_SIZE + 1)
+        manifest = json.dumps({
+            "count": len(post_list), "page_size": PAGE_SIZE, "pages": page_count, "months": months,
+        }, separators=(",", ":"))
+        graph.build_output(f"{prefix}listing.json", {"manifest": content_hash(manifest)}, lambda: manifest)
+        return written
+
+    # Generate index pages
+    profile_stage("index")
+    build_listing("", posts_data, "Blog", index_tmpl)
 
     # Generate tag pages (parent tags include all descendant posts)
+    profile_stage("tag pages")
     if tag_map:
-        tag_tmpl = load_template("tag.html")
-        for tag, tag_posts in tag_map.items():
-            all_posts = list(tag_posts)
-            if tag in descendant_map:
-                seen = {p["url_slug"] for p in all_posts}
-                for desc_tag in descendant_map[tag]:
-                    for p in tag_map.get(desc_tag, []):
-                        if p["url_slug"] not in seen:
-                            all_posts.append(p)
-                            seen.add(p["url_slug"])
-                all_posts.sort(key=lambda p: p["date"], reverse=True)
-            tag_content = render_template(
-                tag_tmpl,
-                tag=html.escape(tag),
-                posts=make_post_list(all_posts),
+        tag_tmpl = load("tag.html")
+        tag_written = 0
+        for tag, all_posts in tag_listings.items():
+            tag_written += build_listing(
+                f"tag/{tag}/", all_posts, f"Posts tagged: {tag}", tag_tmpl, tag=html.escape(tag),
+                feed=html.escape(f"tag/{tag}/"),
             )
-            tag_html = render_template(
-                base_tmpl, title=f"Posts tagged: {tag}", content=tag_content, sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html
-            )
-            if cdn:
-                tag_html = rewrite_cdn_urls(tag_html, cdn)
-            tag_dir = SITE_DIR / "tag" / tag
-            tag_dir.mkdir(parents=True, exist_ok=True)
-            (tag_dir / "index.html").write_text(tag_html, encoding="utf-8")
-        print(f"Generated {len(tag_map)} tag pages")
-
-    # Generate RSS feed
-    rss_xml = generate_rss(posts_data)
-    (SITE_DIR / "feed.xml").write_text(rss_xml, encoding="utf-8")
-
-    # Copy only referenced assets (skip when using CDN)
-    copied_assets = 0
+        print(f"Generated {len(tag_map)} tag listings ({tag_written} pages written)")
+
+    # Generate feeds (RSS, Atom, JSON Feed) for the blog and each tag, with
+    # full post content. A feed is rewritten only when its item set or one
+    # of its posts changed.
+    profile_stage("feeds")
+    feed_keys = {}
+    feed_items = state.feed_items
+    full_content = {}
+
+    def feed_key(post):
+        slug = post["url_slug"]
+        if slug not in feed_keys:
+            feed_keys[slug] = dep_hash(listing_keys[slug], content_hash(post["body_html"]))
+        return feed_keys[slug]
+
+    def render_feed(name, title, path, posts):
+        """Feed name for posts; each post's item is re-rendered only when it changed."""
+        writer, render_item = FEED_FORMATS[name]
+        items = []
+        for post in posts:
+            slug = post["url_slug"]
+            hit = feed_items.get((name, slug))
+            if hit is None or hit[0] != feed_key(post) or hit[1] != cdn:
+                if slug not in full_content:
+                    body = post["body_html"]
+                    full_content[slug] = absolute_urls(rewrite_cdn_urls(body, cdn) if cdn else body)
+                hit = feed_items[name, slug] = (feed_key(post), cdn, render_item(post, full_content[slug]))
+            items.append(hit[2])
+        return writer(title, path, posts, items)
+
+    feeds = [("", "Blog", posts_data)] + [
+        (f"tag/{tag}/", f"Blog: posts tagged {tag}", tag_posts) for tag, tag_posts in tag_listings.items()
+    ]
+    feeds_written = 0
+    for prefix, feed_title, feed_posts in feeds:
+        items = feed_posts[:FEED_SIZE]
+        deps = None
+        for name in FEED_FORMATS:
+            path = prefix + name
+            if graph.keep(path):
+                continue
+            if deps is None:
+                deps = {"items": dep_hash([feed_key(p) for p in items]), "cdn": cdn or ""}
+            feeds_written += graph.build_output(
+                path, deps, partial(render_feed, name, feed_title, path, items))
+    print(f"Generated {len(feeds) * len(FEED_FORMATS)} feeds ({feeds_written} written)")
+
+    # Search page and index
+    profile_stage("search")
+    search_tmpl = load("search.html")
+    if not graph.keep(f"{SEARCH_DIR_NAME}/index.html"):
+        graph.build_output(f"{SEARCH_DIR_NAME}/index.html", dict(page_deps, template=dep_hash(base_tmpl, search_tmpl)),
+                           lambda: render_template(base_tmpl, title="Search", content=search_tmpl,
+                                                   sidebar=tag_sidebar_html, timeline_sidebar=timeline_sidebar_html))
+    search_cache = write_search_index(posts_data, search_posts, search_cache, graph)
+
+    removed = graph.prune()
+    if removed:
+        print(f"Removed {len(removed)} stale pages")
+
+    # Sync only referenced assets. With a CDN only the generated ones (which
+    # aren't committed, so the CDN doesn't have them) ship with the site.
+    profile_stage("assets")
     if cdn:
-        # Clean cached assets from _site/files/ since CDN serves them
-        files_out = SITE_DIR / "files"
-        if files_out.exists():
-            shutil.rmtree(files_out)
+        all_assets = {asset for asset in all_assets if is_generated(asset)}
         print(f"CDN mode: serving files from {cdn}")
-    else:
-        for asset in all_assets:
-            src = BLOG_DIR / asset
-            if src.exists():
-                # Skip LFS pointer files (small text files starting with "version https://git-lfs")
-                if src.stat().st_size < 200:
-                    try:
-                        head = src.read_bytes()[:40]
-                        if head.startswith(b"version https://git-lfs"):
-                            continue
-                    except Exception:
-                        pass
-                dst = SITE_DIR / asset
-                dst.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(src, dst)
-                copied_assets += 1
+    # Stray files are swept on the first build of a session; --watch
+    # rebuilds only remove assets that dropped out since the last one.
+    # Posts-only rebuilds look at just the edited posts' assets and any new
+    # variants; files/ isn't watched, so the rest can't have moved.
+    asset_manifest, asset_stats = sync_assets(
+        all_assets, cache.get("assets", {}), full_prune=state.cache is None,
+        check=edited_assets if edited else None)
+
+    # Precompressed siblings for servers that serve foo.gz/foo.br in place of foo
+    profile_stage("compress")
+    compressed, compressed_count = precompress(
+        graph.current, graph.written, cache.get("compressed", {}), enabled=compress)
+    if compress:
+        print(f"Compressed {compressed_count} outputs ({'gzip + brotli' if HAS_BROTLI else 'gzip; install brotli for .br'})")
 
     # Save build cache
-    save_cache(new_cache)
+    profile_stage("save cache")
+    state.cache = {"posts": new_posts, "outputs": graph.current, "assets": asset_manifest,
+                   "thumbs": new_thumb_sources, "images": new_image_sources, "search": search_cache,
+                   "compressed": compressed}
+    state.changed = None
+    if state.save_cache:
+        save_cache(state.cache)
+        asset_index.save()
 
     print(f"Built {len(posts_data)} posts to {SITE_DIR.relative_to(BLOG_DIR)} ({rendered_count} rendered, {cached_count} cached, {written_count} written, {skipped_count} skipped)")
-    print(f"Copied {copied_assets} referenced assets")
+    graph.report(explain=explain)
+    if profile:
+        profile_stage(None)
+        _profiler.report()
+        print_markdown_profile(md_timings, rendered_count)
+        _profiler.write_trace(profile)
+        print(f"Wrote trace to {profile} (open in chrome://tracing or ui.perfetto.dev)")
+    print("Assets: " + ", ".join(f"{n} {kind}" for kind, n in asset_stats.items()))
+    if asset_stats["missing"]:
+        print("  (build.py --assets lists missing and unreferenced files)")
+
+
+def print_markdown_profile(timings, rendered_count):
+    """Print the markdown stage breakdown gathered with render_markdown(timings=...)."""
+    total = sum(timings.values())
+    print(f"Markdown profile ({rendered_count} posts rendered, {total * 1000:.1f} ms):")
+    for stage in ("setup", "parse", "smarty", "codehilite", "toc", "serialize", "other"):
+        secs = timings.get(stage, 0.0)
+        share = secs / total * 100 if total else 0.0
+        print(f"  {stage:<11} {secs * 1000:9.1f} ms  {share:5.1f}%")
+
+
+# --- Watch mode ---
+WATCH_DIRS = [BLOG_DIR / "posts", TEMPLATE_DIR, STATIC_DIR, COMMENTS_DIR]
+WATCH_FILES = [BLOG_DIR / "tags.yml"]
+LIVERELOAD_PORT = 35729
+
+
+def _is_watched(path):
+    """Ignore editor swap/backup files and anything outside the watched inputs."""
+    name = path.name
+    if name.startswith((".", "#")) or name.endswith(("~", ".swp", ".swx", ".tmp")):
+        return False
+    return path in WATCH_FILES or any(d in path.parents for d in WATCH_DIRS)
+
+
+class PollingWatcher:
+    """Portable fallback: compare (mtime, size) snapshots of the inputs."""
+
+    def __init__(self, interval=0.3):
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snap = {}
+        paths = [p for d in WATCH_DIRS if d.is_dir() for p in d.rglob("*")]
+        for p in paths + WATCH_FILES:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if not p.is_dir():
+                snap[p] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def wait(self):
+        """Block until something changes; return the set of changed paths."""
+        while True:
+            time.sleep(self.interval)
+            snap = self._scan()
+            changed = {p for p in snap.keys() | self.snapshot.keys()
+                       if snap.get(p) != self.snapshot.get(p) and _is_watched(p)}
+            self.snapshot = snap
+            if changed:
+                return changed
+
+
+class InotifyWatcher:
+    """Linux inotify via ctypes, watching every directory under WATCH_DIRS
+    plus BLOG_DIR itself (for tags.yml). Raises OSError where unavailable."""
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, debounce=0.05):
+        import ctypes
+        import ctypes.util
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is Linux-only")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.debounce = debounce
+        self.wds = {}
+        self._add(BLOG_DIR)
+        for d in WATCH_DIRS:
+            if d.is_dir():
+                self._add_tree(d)
+
+    def _add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self.wds[wd] = directory
+
+    def _add_tree(self, root):
+        self._add(root)
+        for d in root.rglob("*"):
+            if d.is_dir():
+                self._add(d)
+
+    def _read_events(self):
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            directory = self.wds.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and path != BLOG_DIR / SITE_DIR.name:
+                    self._add_tree(path)
+                continue
+            if _is_watched(path):
+                changed.add(path)
+        return changed
+
+    def wait(self):
+        """Block until something changes; return the set of changed paths.
+        Events arriving within the debounce window are coalesced."""
+        while True:
+            select.select([self.fd], [], [])
+            changed = self._read_events()
+            while select.select([self.fd], [], [], self.debounce)[0]:
+                changed |= self._read_events()
+            if changed:
+                return changed
+
+
+def livereload_snippet(port):
+    """Script injected into pages in --watch --livereload mode."""
+    return (
+        f'<script>new EventSource("http://localhost:{port}/events")'
+        f'.onmessage = () => location.reload();</script>\n'
+    )
+
+
+class LiveReloadServer:
+    """Tiny server-sent-events endpoint that tells open pages to reload."""
+
+    def __init__(self, port=LIVERELOAD_PORT):
+        self.version = 0
+        self.changed = threading.Condition()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/events":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-store")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                seen = server.version
+                try:
+                    while True:
+                        with server.changed:
+                            server.changed.wait_for(lambda: server.version != seen, timeout=15)
+                        if server.version != seen:
+                            seen = server.version
+                            self.wfile.write(b"data: reload\n\n")
+                        else:
+                            self.wfile.write(b": keep-alive\n\n")
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("", port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def notify(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+
+def watch(local=False, cdn=None, jobs=None, livereload=False):
+    """Build once, then rebuild whenever posts, templates, static files,
+    comments or tags.yml change. Parsed inputs stay in memory between builds."""
+    # The cache is only written on exit; rewriting it after every edit
+    # would dominate the rebuild time.
+    state = BuildState(livereload_port=LIVERELOAD_PORT if livereload else None, save_cache=False)
+    build(local=local, cdn=cdn, jobs=jobs, state=state)
+    # Exit through the finally below on SIGTERM too, so the cache is saved
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    reloader = LiveReloadServer() if livereload else None
+    try:
+        watcher = InotifyWatcher()
+        kind = "inotify"
+    except OSError:
+        watcher = PollingWatcher()
+        kind = "polling"
+    print(f"Watching {', '.join(str(p.relative_to(BLOG_DIR)) for p in WATCH_DIRS + WATCH_FILES)} ({kind})")
+    if reloader:
+        print(f"Live reload on http://localhost:{LIVERELOAD_PORT}/events")
+
+    try:
+        while True:
+            changed = watcher.wait()
+            names = ", ".join(sorted(str(p.relative_to(BLOG_DIR)) for p in changed))
+            print(f"\nChanged: {names}")
+            # Kept until a build succeeds, so a failed one's edits carry over
+            state.changed = changed | (state.changed or set())
+            t0 = time.perf_counter()
+            try:
+                build(local=local, cdn=cdn, jobs=jobs, state=state)
+            except Exception as e:  # keep watching after a broken edit
+                print(f"Build failed: {e!r}")
+                continue
+            print(f"Rebuilt in {(time.perf_counter() - t0) * 1000:.0f} ms")
+            if reloader:
+                reloader.notify()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        if state.cache is not None:
+            save_cache(state.cache)
+            state.asset_index.save()
 
 
 if __name__ == "__main__":
@@ -871,5 +2763,28 @@ if __name__ == "__main__":
     parser.add_argument("--force", action="store_true", help="Force full rebuild (ignore cache)")
     parser.add_argument("--cdn", nargs="?", const=CDN_BASE_URL, default=None,
                         help="Serve files/ from CDN instead of bundling (default: raw GitHub URLs)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Render posts and encode images in N worker processes (0 = one per CPU; "
+                             "default: render serially, encode with one per CPU)")
+    parser.add_argument("--explain", action="store_true",
+                        help="List every output page and why it was written or skipped")
+    parser.add_argument("--profile", nargs="?", const=str(PROFILE_FILE), default=None, metavar="TRACE",
+                        help="Time and trace allocations per stage and per post; print a summary "
+                             f"and write a Chrome/Perfetto trace (default: {PROFILE_FILE.name})")
+    parser.add_argument("--compress", action="store_true",
+                        help="Write .gz (and .br, if brotli is installed) siblings of changed HTML/CSS/JS/XML/JSON")
+    parser.add_argument("--assets", action="store_true",
+                        help="Report referenced files/ assets that are missing and files no post references")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and rebuild when sources change")
+    parser.add_argument("--livereload", action="store_true",
+                        help=f"With --watch, reload open pages after each rebuild (SSE on port {LIVERELOAD_PORT})")
     args = parser.parse_args()
-    build(local=args.local, force=args.force, cdn=args.cdn)
+    jobs = args.jobs if args.jobs is None or args.jobs > 0 else (os.cpu_count() or 1)
+    if args.assets:
+        asset_report()
+    elif args.watch:
+        watch(local=args.local, cdn=args.cdn, jobs=jobs, livereload=args.livereload)
+    else:
+        build(local=args.local, force=args.force, cdn=args.cdn, jobs=jobs, explain=args.explain,
+              profile=args.profile, compress=args.compress)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Benchmark the regex text passes of build.py against their previous versions.
+
+Runs each pass over every post under posts/ (and over the rendered HTML for
+the HTML-side passes), once with the reference implementation below and
+once with build.py's, checks that the outputs are identical and prints the
+best-of-N time for each.
+
+Usage:
+    python bench_text_passes.py          # best of 5
+    python bench_text_passes.py -r 20    # best of 20
+"""
+
+import argparse
+import html
+import re
+import sys
+import time
+from pathlib import Path
+
+BLOG_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BLOG_DIR))
+
+import build  # noqa: E402
+
+CDN_BASE = "https://cdn.example.com/notes"
+
+# ── Reference implementations (build.py before the pass rewrite) ──────────
+
+
+def old_extract_excerpt(text, max_len=200):
+    clean = re.sub(r"^#{1,6}\s+.*$", "", text, flags=re.MULTILINE)
+    clean = re.sub(r"!\[.*?\]\(.*?\)", "", clean)
+    clean = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", clean)
+    clean = re.sub(r"[*_`~]", "", clean)
+    clean = re.sub(r"<[^>]+>", "", clean)
+    for para in clean.split("\n\n"):
+        para = para.strip()
+        if para and not para.startswith("[") and len(para) > 20:
+            if len(para) > max_len:
+                return para[:max_len].rsplit(" ", 1)[0] + "..."
+            return para
+    return ""
+
+
+def old_asset_refs(text):
+    # Stops at "]" like FILES_REF_RE now does, so [files/x](files/x) gives
+    # files/x and not one bogus path; only the pattern's shape differs
+    return {f"files/{m.group(1)}" for m in re.finditer(r'(?<![a-z/])files/([^"\')\]\s]+)', text)}
+
+
+OLD_MEDIA_RE = re.compile(
+    r'^[ \t]*!\[([^\]]*)\]\(<?([^)>\s]+\.[A-Za-z0-9]+)>?\)[ \t]*$',
+    re.MULTILINE,
+)
+
+
+def old_convert_media_links(text):
+    def replace(match):
+        caption = match.group(1).strip()
+        src = match.group(2).strip()
+        ext = src.rsplit('.', 1)[-1].lower() if '.' in src else ''
+        if ext in build.AUDIO_EXTS:
+            kind = 'audio'
+            media = (
+                f'<audio controls preload="metadata" '
+                f'src="{html.escape(src, quote=True)}"></audio>'
+            )
+        elif ext in build.VIDEO_EXTS:
+            kind = 'video'
+            media = (
+                f'<video controls preload="metadata" playsinline>'
+                f'<source src="{html.escape(src, quote=True)}">'
+                f'</video>'
+            )
+        else:
+            return match.group(0)
+        figcap = (
+            f'<figcaption>{html.escape(caption)}</figcaption>' if caption else ''
+        )
+        return f'\n<figure class="{kind}-figure">{media}{figcap}</figure>\n'
+    return OLD_MEDIA_RE.sub(replace, text)
+
+
+def old_add_target_blank(html_text):
+    def _repl(match):
+        tag = match.group(0)
+        href = re.search(r'href=(["\'])(.*?)\1', tag)
+        if href and "#" in href.group(2):
+            return tag
+        return tag[:-1] + ' target="_blank" rel="noopener">'
+    return re.sub(r'<a\s+((?:(?!target=)[^>])*)>', _repl, html_text)
+
+
+def old_rewrite_cdn_urls(html_text, cdn_base):
+    html_text = re.sub(r'((?:src|href)=["\'])files/', rf'\1{cdn_base}/files/', html_text)
+    return re.sub(
+        r'(srcset=["\'])([^"\']*)',
+        lambda m: m.group(1) + re.sub(r'(^|,\s*)files/', rf'\1{cdn_base}/files/', m.group(2)),
+        html_text,
+    )
+
+
+# (name, input kind, reference, current)
+PASSES = [
+    ("extract_excerpt", "md", old_extract_excerpt, build.extract_excerpt),
+    ("asset refs", "md", old_asset_refs,
+     lambda text: {f"files/{m.group(1)}" for m in build.FILES_REF_RE.finditer(text)}),
+    ("convert_media_links", "md", old_convert_media_links, build.convert_media_links),
+    ("add_target_blank", "html", old_add_target_blank, build.add_target_blank),
+    ("rewrite_cdn_urls", "html", lambda t: old_rewrite_cdn_urls(t, CDN_BASE),
+     lambda t: build.rewrite_cdn_urls(t, CDN_BASE)),
+]
+
+
+def best_of(fn, texts, repeat):
+    """Best wall time of running fn over all texts, and the outputs."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(t) for t in texts]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Runs per pass; the best is reported (default: 5)")
+    args = parser.parse_args()
+
+    md_files = sorted(BLOG_DIR.glob("posts/*/*.md"))
+    markdown = [build.parse_frontmatter(f.read_text(encoding="utf-8"))[1] for f in md_files]
+    rendered = [build.render_markdown(text) for text in markdown]
+    inputs = {"md": markdown, "html": rendered}
+    print(f"{len(md_files)} posts, {sum(map(len, markdown)) / 1e6:.1f} MB markdown, "
+          f"{sum(map(len, rendered)) / 1e6:.1f} MB html\n")
+
+    print(f"{'pass':<22}  {'before ms':>9}  {'after ms':>9}  {'speedup':>7}")
+    ok = True
+    for name, kind, old, new in PASSES:
+        t_old, out_old = best_of(old, inputs[kind], args.repeat)
+        t_new, out_new = best_of(new, inputs[kind], args.repeat)
+        same = out_old == out_new
+        ok &= same
+        print(f"{name:<22}  {t_old * 1000:>9.2f}  {t_new * 1000:>9.2f}  "
+              f"{t_old / t_new:>6.1f}x{'' if same else '  OUTPUT DIFFERS'}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
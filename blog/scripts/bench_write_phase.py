@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark the post-page write phase of build.py on synthetic posts.
+
+Generates up to 5000 synthetic posts and times write_post_pages() on a
+cold output directory (every page written) and again on a warm one
+(every page skipped via the build graph). Per-post time should stay flat
+as the post count grows.
+
+Usage:
+    python bench_write_phase.py            # 625, 1250, 2500, 5000 posts
+    python bench_write_phase.py -n 5000    # a single size
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BLOG_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BLOG_DIR))
+
+import build  # noqa: E402
+
+PARAGRAPH = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12 + "</p>\n"
+
+
+def synthetic_posts(n, post_tmpl):
+    """Return posts_data for n fake posts, newest first."""
+    start = datetime(2000, 1, 1)
+    posts_data = []
+    for i in reversed(range(n)):
+        date = start + timedelta(days=i)
+        filename = f"{date:%Y%m%d}_synthetic_{i}.md"
+        url_slug = f"{date:%Y%m%d}-synthetic-{i}"
+        title = f"Synthetic post {i}"
+        post_html = build.render_template(
+            post_tmpl, title=title, date=date.strftime("%B %d, %Y"),
+            body=PARAGRAPH * 8, comments="", comment_endpoint="",
+            post_slug=url_slug, tag_chips="", title_id_attr="",
+        )
+        posts_data.append({
+            "filename": filename,
+            "title": title,
+            "date": date,
+            "date_str": date.strftime("%B %d, %Y"),
+            "url_slug": url_slug,
+            "excerpt": "",
+            "tags": [],
+            "thumbnail": "",
+            "post_html": post_html,
+        })
+    return posts_data
+
+
+def run(n, base_tmpl, post_tmpl, sidebar):
+    """Time a cold and a warm write of n posts. Returns (cold_s, warm_s)."""
+    posts_data = synthetic_posts(n, post_tmpl)
+    with tempfile.TemporaryDirectory() as tmp:
+        build.SITE_DIR = Path(tmp)
+
+        graph = build.BuildGraph({})
+        t0 = time.perf_counter()
+        written, _ = build.write_post_pages(posts_data, graph, base_tmpl, sidebar, sidebar)
+        cold = time.perf_counter() - t0
+        assert written == n
+
+        # Second run sees the first run's graph, so every page is skipped
+        graph = build.BuildGraph(graph.current)
+        t0 = time.perf_counter()
+        _, skipped = build.write_post_pages(posts_data, graph, base_tmpl, sidebar, sidebar)
+        warm = time.perf_counter() - t0
+        assert skipped == n
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, action="append",
+                        help="Post count to benchmark (repeatable)")
+    args = parser.parse_args()
+    sizes = args.n or [625, 1250, 2500, 5000]
+
+    base_tmpl = build.load_template("base.html")
+    post_tmpl = build.load_template("post.html")
+    sidebar = '<a href="tag/x/" class="tag-sidebar-link">x <span class="tag-count">1</span></a>\n' * 200
+
+    print(f"{'posts':>6}  {'cold s':>8}  {'cold us/post':>12}  {'warm s':>8}  {'warm us/post':>12}")
+    for n in sizes:
+        cold, warm = run(n, base_tmpl, post_tmpl, sidebar)
+        print(f"{n:>6}  {cold:>8.3f}  {cold / n * 1e6:>12.1f}  {warm:>8.3f}  {warm / n * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,22 @@
 """Find duplicate photoblog posts by comparing actual image file hashes.
 
 If two posts reference images with identical content (same MD5), the
-second post is considered a duplicate and removed.
+second post is considered a duplicate and removed. Its images are removed
+too, unless the original post uses them, or the asset index (build.py's
+AssetIndex) shows another remaining post still referencing them or has
+no record of them at all.
 """
 
 import hashlib
 import re
+import sys
 from pathlib import Path
 
-BLOG_DIR = Path(__file__).parent.parent
+BLOG_DIR = Path(__file__).resolve().parent.parent
 PHOTO_DIR = BLOG_DIR / "files" / "photoblog"
+sys.path.insert(0, str(BLOG_DIR))
+
+from build import AssetIndex  # noqa: E402
 
 
 def file_hash(path):
@@ -32,6 +39,9 @@ def main():
     photo_posts = sorted(BLOG_DIR.glob("posts/*/*_photo.md"))
     print(f"Checking {len(photo_posts)} photoblog posts for image duplicates...\n")
 
+    index = AssetIndex.load()
+    index.refresh()
+
     # Build hash -> first post mapping
     hash_to_post = {}  # image_hash -> (post_path, image_name)
     to_delete_posts = []
@@ -53,7 +63,6 @@ def main():
             orig_post, orig_img = hash_to_post[h]
             print(f"  DUP: {p.name} (same image as {orig_post.name})")
             to_delete_posts.append(p)
-            # Delete images unique to this post
             for img in images:
                 img_p = PHOTO_DIR / img
                 if img_p.exists() and img not in get_images(orig_post):
@@ -62,9 +71,19 @@ def main():
             hash_to_post[h] = (p, images[0])
 
     if not to_delete_posts:
+        index.save()
         print("No image-based duplicates found.")
         return
 
+    # Keep images that a post outside the deleted set still references. The
+    # index only knows paths its scan could read (it stops at whitespace and
+    # ")"), so an image it has no posts for is kept rather than assumed unused.
+    deleted = {p.relative_to(BLOG_DIR).as_posix() for p in to_delete_posts}
+    to_delete_images = [
+        img_p for img_p in dict.fromkeys(to_delete_images)
+        if (users := set(index.posts_for(img_p.relative_to(BLOG_DIR).as_posix()))) and users <= deleted
+    ]
+
     print(f"\nFound {len(to_delete_posts)} duplicate posts, {len(to_delete_images)} orphaned images")
     print("Deleting...")
 
@@ -73,6 +92,8 @@ def main():
     for p in to_delete_images:
         if p.exists():
             p.unlink()
+    index.refresh()
+    index.save()
 
     print(f"Deleted {len(to_delete_posts)} posts and {len(to_delete_images)} images")
 
@@ -0,0 +1,125 @@
+(function () {
+  'use strict';
+
+  // Progressive enhancement for paginated listings (index and tag pages).
+  // Each listing page holds one page of posts plus a plain newer/older pager.
+  // With JS, following pages are appended as the reader scrolls, and timeline
+  // clicks scroll to the requested month, loading pages until it is present
+  // (or opening the earlier page it is on). listing.json
+  // (next to the listing's first page) gives the page count and the page
+  // each month starts on.
+
+  var list = document.querySelector('ul.post-list[data-listing]');
+  if (!list) return;
+
+  var manifestUrl = new URL(list.getAttribute('data-listing'), document.baseURI);
+  var rootUrl = new URL('./', manifestUrl);
+  var pager = document.querySelector('nav.pager');
+  var manifest = null;
+  var first = Number(list.getAttribute('data-page')) || 1;  // page this document is
+  var loaded = first;  // last page appended to the list
+  var pending = null;
+
+  function pageUrl(n) {
+    return n === 1 ? rootUrl.href : new URL('page/' + n + '/', rootUrl).href;
+  }
+
+  // Append page n's <li> items. Resolves once the page is in the list.
+  function loadNext() {
+    if (pending) return pending;
+    if (!manifest || loaded >= manifest.pages) return Promise.resolve(false);
+    var n = loaded + 1;
+    pending = fetch(pageUrl(n))
+      .then(function (res) {
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        return res.text();
+      })
+      .then(function (text) {
+        var doc = new DOMParser().parseFromString(text, 'text/html');
+        var items = doc.querySelectorAll('ul.post-list > li');
+        for (var i = 0; i < items.length; i++) {
+          list.appendChild(document.importNode(items[i], true));
+        }
+        loaded = n;
+        if (loaded >= manifest.pages && pager) pager.hidden = true;
+        return true;
+      })
+      .finally(function () { pending = null; });
+    return pending;
+  }
+
+  function loadThrough(page) {
+    if (loaded >= page) return Promise.resolve();
+    return loadNext().then(function (more) {
+      if (more) return loadThrough(page);
+    });
+  }
+
+  // First page that holds a timeline target ("date-2024" or "date-2024-05")
+  function pageFor(target) {
+    var key = target.replace(/^date-/, '');
+    var best = null;
+    Object.keys(manifest.months).forEach(function (month) {
+      if (month === key || month.slice(0, 4) === key) {
+        var page = manifest.months[month];
+        if (best === null || page < best) best = page;
+      }
+    });
+    return best;
+  }
+
+  function findTarget(target) {
+    return list.querySelector('li[data-year="' + target + '"], li[data-month="' + target + '"]');
+  }
+
+  fetch(manifestUrl.href)
+    .then(function (res) { return res.ok ? res.json() : null; })
+    .then(function (data) {
+      manifest = data;
+      if (!manifest || loaded >= manifest.pages || !pager) return;
+
+      if ('IntersectionObserver' in window) {
+        // The pager stays in the layout as the scroll sentinel
+        pager.style.visibility = 'hidden';
+        var observer = new IntersectionObserver(function (entries) {
+          if (entries[0].isIntersecting) {
+            loadNext().then(function () {
+              if (loaded >= manifest.pages) {
+                observer.disconnect();
+              } else {
+                // Re-observe so a sentinel still in view triggers the next page
+                observer.unobserve(pager);
+                observer.observe(pager);
+              }
+            });
+          }
+        }, { rootMargin: '600px 0px' });
+        observer.observe(pager);
+      }
+    });
+
+  // Timeline sidebar: scroll to the clicked year/month, loading enough pages
+  // for it first if needed.
+  window.addEventListener('click', function (e) {
+    var label = e.target.closest && e.target.closest('.timeline-label[data-scroll]');
+    if (!label) return;
+    var target = label.getAttribute('data-scroll');
+    var present = findTarget(target);
+    if (present) {
+      present.scrollIntoView({ behavior: 'smooth', block: 'start' });
+      return;
+    }
+    var page = manifest && pageFor(target);
+    if (!page) return;
+    e.preventDefault();
+    e.stopPropagation();
+    if (page < first) {
+      window.location.href = pageUrl(page);
+      return;
+    }
+    loadThrough(page).then(function () {
+      var el = findTarget(target);
+      if (el) el.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    });
+  }, true);
+})();
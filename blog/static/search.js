@@ -0,0 +1,162 @@
+(function () {
+  'use strict';
+
+  // Client for the search index written by build.py (write_search_index).
+  // search/docs.json lists the posts; search/<hex prefix>.json holds the
+  // postings of every term starting with that prefix, so a query only
+  // fetches the shards of its own words. Every query word matches as a
+  // prefix; exact term matches score higher.
+
+  var MAX_RESULTS = 50;
+  var PREFIX_MATCH_FACTOR = 0.5;
+
+  var input = document.getElementById('search-input');
+  var status = document.getElementById('search-status');
+  var results = document.getElementById('search-results');
+  if (!input || !results) return;
+
+  var base = new URL('search/', document.baseURI);
+  var docsPromise = null;
+  var shardCache = {};
+  var latest = 0;
+
+  // ── Tokenization (mirrors search_tokens() in build.py) ───────────────────
+
+  var CHAR_MAP = {
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
+    'ة': 'ه', '‌': ' ', 'ـ': '', 'ٰ': '',
+  };
+  for (var c = 0x064B; c < 0x0660; c++) CHAR_MAP[String.fromCharCode(c)] = '';
+  for (var d = 0; d < 10; d++) {
+    CHAR_MAP[String.fromCharCode(0x06F0 + d)] = String(d);
+    CHAR_MAP[String.fromCharCode(0x0660 + d)] = String(d);
+  }
+
+  function tokenize(text) {
+    var normalized = Array.from(text.normalize('NFKC').toLowerCase()).map(function (ch) {
+      return ch in CHAR_MAP ? CHAR_MAP[ch] : ch;
+    }).join('');
+    return (normalized.match(/[\p{L}\p{N}_]+/gu) || []).filter(function (t) {
+      var n = Array.from(t).length;
+      return n >= 2 && n <= 40;
+    });
+  }
+
+  function shardName(token) {
+    var prefix = Array.from(token).slice(0, 2).join('');
+    return Array.from(new TextEncoder().encode(prefix)).map(function (b) {
+      return b.toString(16).padStart(2, '0');
+    }).join('');
+  }
+
+  // ── Fetching ─────────────────────────────────────────────────────────────
+
+  function fetchJSON(name) {
+    return fetch(new URL(name, base).href).then(function (res) {
+      return res.ok ? res.json() : {};
+    }).catch(function () { return {}; });
+  }
+
+  function loadDocs() {
+    if (!docsPromise) docsPromise = fetchJSON('docs.json');
+    return docsPromise;
+  }
+
+  function loadShard(name) {
+    if (!shardCache[name]) shardCache[name] = fetchJSON(name + '.json');
+    return shardCache[name];
+  }
+
+  // ── Query ────────────────────────────────────────────────────────────────
+
+  // docId -> score for one query word
+  function scoreToken(token, shard) {
+    var scores = {};
+    Object.keys(shard).forEach(function (term) {
+      if (term.lastIndexOf(token, 0) !== 0) return;
+      var factor = term === token ? 1 : PREFIX_MATCH_FACTOR;
+      shard[term].forEach(function (posting) {
+        scores[posting[0]] = (scores[posting[0]] || 0) + posting[1] * factor;
+      });
+    });
+    return scores;
+  }
+
+  function search(query) {
+    var tokens = tokenize(query);
+    if (!tokens.length) return Promise.resolve(null);
+    return Promise.all([loadDocs()].concat(tokens.map(function (t) {
+      return loadShard(shardName(t));
+    }))).then(function (loaded) {
+      var docs = loaded[0].docs || {};
+      var total = null;
+      tokens.forEach(function (token, i) {
+        var scores = scoreToken(token, loaded[i + 1]);
+        if (total === null) {
+          total = scores;
+          return;
+        }
+        var merged = {};
+        Object.keys(total).forEach(function (id) {
+          if (id in scores) merged[id] = total[id] + scores[id];
+        });
+        total = merged;
+      });
+      return Object.keys(total).filter(function (id) { return id in docs; })
+        .sort(function (a, b) { return total[b] - total[a]; })
+        .map(function (id) { return docs[id]; });
+    });
+  }
+
+  // ── Rendering ────────────────────────────────────────────────────────────
+
+  function render(query, matches) {
+    results.textContent = '';
+    if (matches === null) {
+      status.textContent = '';
+      return;
+    }
+    status.textContent = matches.length + (matches.length === 1 ? ' post' : ' posts') +
+      ' matching “' + query + '”';
+    matches.slice(0, MAX_RESULTS).forEach(function (doc) {
+      var li = document.createElement('li');
+      var a = document.createElement('a');
+      a.href = doc[0] + '/';
+      var title = document.createElement('span');
+      title.className = 'post-title';
+      title.textContent = doc[1];
+      var date = document.createElement('span');
+      date.className = 'post-date';
+      date.textContent = doc[2];
+      a.appendChild(title);
+      a.appendChild(date);
+      li.appendChild(a);
+      results.appendChild(li);
+    });
+  }
+
+  function run() {
+    var query = input.value.trim();
+    var id = ++latest;
+    var url = new URL(window.location.href);
+    if (query) url.searchParams.set('q', query); else url.searchParams.delete('q');
+    history.replaceState(null, '', url.href);
+    search(query).then(function (matches) {
+      if (id === latest) render(query, matches);
+    });
+  }
+
+  var timer = null;
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(run, 150);
+  });
+
+  var initial = new URL(window.location.href).searchParams.get('q');
+  if (initial) {
+    input.value = initial;
+    run();
+  }
+  input.focus();
+})();
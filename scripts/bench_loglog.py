@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark the loglog package on the real .log files.
+
+For every *.log at the repo root: checks that dump(parse(text)) gives the
+file back byte for byte, then prints the best-of-N time to parse, dump and
+classify it, and the memory the parsed tree takes. For comparison, the
+"dict tree" columns build the same tree the way shared/loglog-viewer.js
+does (one dict per line, split on "\\n"), which is also how a quick Python
+port would.
+
+Usage:
+    python bench_loglog.py          # best of 5
+    python bench_loglog.py -r 20    # best of 20
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import loglog
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def dict_build_tree(text):
+    """buildTree from shared/loglog-viewer.js, as plain Python."""
+    root = {"raw": "", "indent": -1, "children": [], "lineIdx": -1}
+    stack = [root]
+    for i, raw in enumerate(text.split("\n")):
+        if not raw.strip():
+            continue
+        indent = len(raw) - len(raw.lstrip())
+        while len(stack) > 1 and stack[-1]["indent"] >= indent:
+            stack.pop()
+        node = {"raw": raw.strip(), "indent": indent, "children": [], "lineIdx": i}
+        stack[-1]["children"].append(node)
+        stack.append(node)
+    return root
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def tree_bytes(build, text):
+    """Bytes still allocated after building a tree from text."""
+    tracemalloc.start()
+    tree = build(text)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tree
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Runs per measurement; the best is reported (default: 5)")
+    args = parser.parse_args()
+
+    print(f"{'file':<14} {'lines':>6} {'nodes':>6}  {'parse ms':>8} {'dump ms':>8} {'classify ms':>11}"
+          f"  {'tree KB':>8}  {'dict tree ms':>12} {'dict tree KB':>12}")
+    ok = True
+    totals = [0, 0, 0.0, 0.0, 0.0, 0, 0.0, 0]
+    for path in sorted(REPO_DIR.glob("*.log")):
+        with open(path, encoding="utf-8", newline="") as f:
+            text = f.read()
+        t_parse, root = best_of(loglog.parse_text, text, args.repeat)
+        t_dump, out = best_of(loglog.dump, root, args.repeat)
+        t_classify, _ = best_of(loglog.classify, root, args.repeat)
+        t_dict, _ = best_of(dict_build_tree, text, args.repeat)
+        size = tree_bytes(loglog.parse_text, text)
+        dict_size = tree_bytes(dict_build_tree, text)
+        same = out == text
+        ok &= same
+        lines = text.count("\n") + (not text.endswith("\n"))
+        nodes = sum(1 for _ in root.walk()) - 1
+        row = [lines, nodes, t_parse * 1000, t_dump * 1000, t_classify * 1000, size, t_dict * 1000, dict_size]
+        totals = [a + b for a, b in zip(totals, row)]
+        print(f"{path.name:<14} {lines:>6} {nodes:>6}  {row[2]:>8.2f} {row[3]:>8.2f} {row[4]:>11.2f}"
+              f"  {size / 1024:>8.0f}  {row[6]:>12.2f} {dict_size / 1024:>12.0f}"
+              f"{'' if same else '  ROUND TRIP DIFFERS'}")
+    lines, nodes, t_parse, t_dump, t_classify, size, t_dict, dict_size = totals
+    print(f"{'total':<14} {lines:>6} {nodes:>6}  {t_parse:>8.2f} {t_dump:>8.2f} {t_classify:>11.2f}"
+          f"  {size / 1024:>8.0f}  {t_dict:>12.2f} {dict_size / 1024:>12.0f}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
 """Batch-enrich all movies missing IMDb data in movies.log.
 
-OMDb free tier: 1000 calls/day, no per-second limit.
-Each movie needs 2 calls (search + details) = ~500 movies per run.
-We add a small delay (0.2s) between movies to be respectful.
+OMDb free tier: 1000 calls/day. Each movie needs up to 2 calls (search +
+details). Lookups run on WORKERS threads through omdb.Client, which reuses
+connections, rate-limits, tracks the day's budget across runs and caches
+responses, so re-runs only pay for movies it hasn't seen.
+
+Results are kept as (movie, lines) patches and merged into movies.log in
+one pass every CHECKPOINT_EVERY movies (and on exit or Ctrl-C), so an
+interrupted run keeps its work: written movies no longer count as
+unenriched, and the rest are answered from the cache next time.
+
+Every attempt and its outcome is appended to a journal (JOURNAL_FILE); an
+outcome that adds lines is journaled once they are written. Movies are
+looked up highest priority first (watched, then recommended ones, then
+the other sections; fewer past failures first), so the day's budget goes
+to those, and lookups the cache can answer still happen once it is spent.
+Movies whose lookups failed are left alone for an exponentially growing
+while (BACKOFF_BASE, doubling up to BACKOFF_MAX).
 """
 
 import json
@@ -11,68 +25,138 @@ import os
 import re
 import sys
 import time
-import urllib.request
-import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import logfile
+import omdb
+from movielog import parse_movies
+
 MOVIES_FILE = Path(__file__).parent.parent / "movies.log"
-OMDB_URL = "http://www.omdbapi.com/"
-TODO_RE = re.compile(r"^(\s*)\[([x\-? ]?)\]\s*(.+?)\s*$", re.IGNORECASE)
-DELAY = 0.2  # seconds between movies
-
-
-def omdb_search(api_key, title, year=None):
-    params = {"apikey": api_key, "s": title, "type": "movie"}
-    if year:
-        params["y"] = year
-    with urllib.request.urlopen(f"{OMDB_URL}?{urllib.parse.urlencode(params)}", timeout=10) as resp:
-        data = json.loads(resp.read())
-    if data.get("Response") == "False":
-        return []
-    return data.get("Search", [])
-
-
-def omdb_details(api_key, imdb_id):
-    params = urllib.parse.urlencode({"apikey": api_key, "i": imdb_id, "plot": "short"})
-    with urllib.request.urlopen(f"{OMDB_URL}?{params}", timeout=10) as resp:
-        data = json.loads(resp.read())
-    if data.get("Response") == "False":
-        return None
-    return data
-
-
-def find_insert_after(lines, movie_idx, movie_indent):
-    idx = movie_idx + 1
-    while idx < len(lines):
-        stripped = lines[idx].rstrip("\n")
-        if not stripped.strip():
-            idx += 1
-            continue
-        line_indent = len(stripped) - len(stripped.lstrip())
-        if line_indent > movie_indent:
-            idx += 1
+YEAR_RE = re.compile(r"\d{4}")
+WORKERS = 4
+CHECKPOINT_EVERY = 25  # movies; results are written in batches this size
+JOURNAL_FILE = Path(os.environ.get("ENRICH_JOURNAL", Path(__file__).parent.parent / ".enrich_journal.jsonl"))
+CALLS_PER_MOVIE = 2  # search + details, for estimating how far the budget goes
+BACKOFF_BASE = 3600  # seconds to wait after a first failure; doubles with each one after
+BACKOFF_MAX = 7 * 86400
+# Top-level sections by priority; movies under a "Recommended by" heading
+# rank RECOMMENDED_PRIORITY, unknown sections last
+SECTION_PRIORITY = {"watched": 0, "to review": 2, "to watch": 3, "skipped": 4}
+RECOMMENDED_PRIORITY = 1
+# Outcomes that count as failures for backoff (a lookup deferred for lack
+# of budget is not an attempt and isn't journaled)
+FAILURES = {"error", "no_details", "no_data"}
+
+
+class Journal:
+    """Append-only JSONL record of enrichment attempts, folded per title.
+
+    state maps a lowercased title to its attempts, consecutive failures,
+    last attempt time, last outcome and last error."""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = Path(path)
+        self.state = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._fold(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue  # a line cut short by a crash
+        except FileNotFoundError:
+            pass
+
+    def _fold(self, entry):
+        if entry["outcome"] == "deferred":
+            return  # written by earlier versions
+        state = self.state.setdefault(entry["title"].lower(), {
+            "attempts": 0, "failures": 0, "last": 0, "outcome": None, "error": None})
+        state["attempts"] += 1
+        state["failures"] = state["failures"] + 1 if entry["outcome"] in FAILURES else 0
+        state["last"] = entry["at"]
+        state["outcome"] = entry["outcome"]
+        state["error"] = entry.get("error")
+
+    def record(self, title, outcome, error=None):
+        entry = {"at": round(time.time()), "title": title, "outcome": outcome}
+        if error:
+            entry["error"] = error
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fold(entry)
+
+    def failures(self, title):
+        return self.state.get(title.lower(), {}).get("failures", 0)
+
+    def retry_at(self, title):
+        """Time before which a title that keeps failing is left alone."""
+        state = self.state.get(title.lower())
+        if not state or not state["failures"]:
+            return 0
+        return state["last"] + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (state["failures"] - 1))
+
+
+def priority(movie):
+    """Rank of a movie's section (lower goes first)."""
+    section = movie.parents[0][1].lstrip("- ").rstrip(":").strip().lower() if movie.parents else ""
+    if section != "watched" and any("recommended by" in text.lower() for _, text in movie.parents):
+        return RECOMMENDED_PRIORITY
+    return SECTION_PRIORITY.get(section, len(SECTION_PRIORITY) + 1)
+
+
+def schedule(movies, journal, now=None):
+    """Split movies into (ready, backing off); ready in the order to spend budget on."""
+    now = time.time() if now is None else now
+    ready = [movie for movie in movies if journal.retry_at(movie.title) <= now]
+    waiting = [movie for movie in movies if journal.retry_at(movie.title) > now]
+    ready.sort(key=lambda movie: (priority(movie), journal.failures(movie.title), movie.line))
+    return ready, waiting
+
+
+def lookup(client, title, user_year):
+    """Search OMDb for a movie and fetch the best match.
+
+    Returns (details, number of exact-title candidates if the pick was
+    ambiguous, else 0); details is None when the search finds nothing and
+    {} when OMDb has no record for the match. Raises omdb.BudgetExhausted,
+    omdb.OMDbError or OSError."""
+    # Try with year filter first (better disambiguation when title collides)
+    results = client.search(title, user_year)
+    # If no results with year, retry without — handles wrong/missing year
+    if not results and user_year:
+        results = client.search(title)
+    if not results:
+        return None, 0
+
+    # Auto-match: exact title > first result.
+    # If user-supplied year is present, prefer the exact-title result whose
+    # Year matches; otherwise fall back to the first exact-title hit; if
+    # nothing exact, take OMDb's top relevance result.
+    match = results[0]
+    exact = [r for r in results if r["Title"].lower() == title.lower()]
+    ambiguous_count = 0
+    if exact:
+        if user_year:
+            year_match = [r for r in exact if r.get("Year", "").startswith(user_year)]
+            match = year_match[0] if year_match else exact[0]
+            if not year_match and len(exact) > 1:
+                ambiguous_count = len(exact)
         else:
-            break
-    return idx
+            match = exact[0]
+            if len(exact) > 1:
+                ambiguous_count = len(exact)
+
+    return client.details(match["imdbID"]) or {}, ambiguous_count
 
 
-def has_imdb_data(lines, movie_idx, movie_indent):
+IMDB_KEYS = ("imdb", "imdb rating", "rating", "genres")
+
+
+def has_imdb_data(movie):
     """Check if a movie already has IMDB link/marker, rating, or genres."""
-    idx = movie_idx + 1
-    while idx < len(lines):
-        stripped = lines[idx].rstrip("\n")
-        if not stripped.strip():
-            idx += 1
-            continue
-        line_indent = len(stripped) - len(stripped.lstrip())
-        if line_indent <= movie_indent:
-            break
-        lower = stripped.strip().lower()
-        if lower.startswith("- imdb:") or lower.startswith("- imdb rating:") or \
-           lower.startswith("- rating:") or lower.startswith("- genres:"):
-            return True
-        idx += 1
-    return False
+    return any(key in movie.properties for key in IMDB_KEYS)
 
 
 def build_imdb_lines(d, indent):
@@ -109,35 +193,63 @@ def build_imdb_lines(d, indent):
 
 
 def find_all_unenriched(lines):
-    """Find all movie entries that lack IMDb data. Returns [(idx, indent, title, year), ...]."""
-    movies = []
-    for i, line in enumerate(lines):
-        m = TODO_RE.match(line.rstrip("\n"))
-        if m:
-            indent = len(m.group(1))
-            title = m.group(3).strip()
-            if not has_imdb_data(lines, i, indent):
-                year = read_user_year(lines, i, indent)
-                movies.append((i, indent, title, year))
-    return movies
-
-
-def read_user_year(lines, movie_idx, movie_indent):
-    """Read the Year property from a movie's children, if present."""
-    idx = movie_idx + 1
-    while idx < len(lines):
-        s = lines[idx].rstrip("\n")
-        if not s.strip():
-            idx += 1
+    """Find all movie entries that lack IMDb data. Returns their movielog.Movie records."""
+    return [movie for movie in parse_movies(lines) if not has_imdb_data(movie)]
+
+
+def read_user_year(movie):
+    """The movie's Year property, if present."""
+    m = YEAR_RE.match(movie.properties.get("year", ""))
+    return m.group(0) if m else None
+
+
+def movie_anchor(lines, movie):
+    """(line, digest) of a movie: where it was read and a hash of its
+    lines, which tells apart copies of a title in different places."""
+    block = "".join(lines[movie.line:movie.end]).rstrip()
+    return movie.line, logfile.content_hash(block.encode("utf-8"))
+
+
+def apply_patches(text, patches):
+    """Insert each (anchor, lines) patch after its movie's children, in one
+    merge pass over movies.log's text. Returns (new text, list of whether
+    each patch was applied).
+
+    A patch goes to the unenriched movie whose lines still hash to the
+    anchor's digest, the one nearest the anchor's line if several do, so
+    patches apply to whatever the file holds now. Movies that are gone,
+    were edited, or got IMDb data in the meantime are left alone."""
+    lines = text.splitlines(keepends=True)
+    spans = {}  # digest -> [(line, span end)] of unenriched movies
+    for movie in parse_movies(lines):
+        if not has_imdb_data(movie):
+            line, digest = movie_anchor(lines, movie)
+            spans.setdefault(digest, []).append((line, movie.end))
+    inserts = []
+    applied = []
+    for (line, digest), new_lines in patches:
+        candidates = spans.get(digest)
+        if not candidates:
+            applied.append(False)
             continue
-        ind = len(s) - len(s.lstrip())
-        if ind <= movie_indent:
-            break
-        m = re.match(r"^\s*-?\s*Year\s*:\s*(\d{4})", s, re.IGNORECASE)
-        if m:
-            return m.group(1)
-        idx += 1
-    return None
+        nearest = min(candidates, key=lambda span: abs(span[0] - line))
+        candidates.remove(nearest)
+        inserts.append((nearest[1], new_lines))
+        applied.append(True)
+    inserts.sort(key=lambda insert: insert[0])
+
+    out = []
+    prev = 0
+    for at, new_lines in inserts:
+        out += lines[prev:at]
+        prev = at
+        if out and not out[-1].endswith("\n"):
+            # Appending at the end of a file with no final newline: keep it that way
+            out[-1] += "\n"
+            new_lines = new_lines[:-1] + [new_lines[-1].rstrip("\n")]
+        out += new_lines
+    out += lines[prev:]
+    return "".join(out), applied
 
 
 def main():
@@ -148,136 +260,124 @@ def main():
 
     dry_run = "--dry-run" in sys.argv or "-n" in sys.argv
 
-    lines = MOVIES_FILE.read_text(encoding="utf-8").splitlines(keepends=True)
+    lines = logfile.read(MOVIES_FILE)[0].splitlines(keepends=True)
     unenriched = find_all_unenriched(lines)
 
-    print(f"Found {len(unenriched)} movies without IMDb data")
+    journal = Journal()
+    ready, waiting = schedule(unenriched, journal)
+    client = omdb.Client(api_key)
+    print(f"Found {len(unenriched)} movies without IMDb data"
+          f"{f' ({len(waiting)} backing off after failures)' if waiting else ''}")
     if dry_run:
         print("(Dry run — no changes will be written)\n")
-    print(f"API budget: ~{len(unenriched) * 2} calls needed, 1000/day limit\n")
-
-    if len(unenriched) * 2 > 1000:
-        print(f"WARNING: This needs {len(unenriched) * 2} API calls but limit is 1000/day.")
-        print(f"Will process first 500 movies and stop.\n")
+    print(f"API budget: {client.remaining()} of {client.budget} calls left today, enough for about "
+          f"{client.remaining() // CALLS_PER_MOVIE} new lookups; cached ones are free\n")
 
     enriched = 0
     skipped = 0
     failed = 0
-    api_calls = 0
-    offset = 0  # tracks line offset from insertions
-
-    for i, (orig_idx, indent, title, user_year) in enumerate(unenriched):
-        if api_calls >= 990:  # leave some buffer
-            print(f"\nStopping: approaching daily API limit ({api_calls} calls used)")
-            break
-
-        idx = orig_idx + offset
-        print(f"[{i+1}/{len(unenriched)}] {title}{' (' + user_year + ')' if user_year else ''}", end=" ", flush=True)
-
-        try:
-            # Try with year filter first (better disambiguation when title collides)
-            results = omdb_search(api_key, title, user_year)
-            api_calls += 1
-            # If no results with year, retry without — handles wrong/missing year
-            if not results and user_year:
-                results = omdb_search(api_key, title)
-                api_calls += 1
-        except Exception as e:
-            err_str = str(e)
-            if "401" in err_str or "limit" in err_str.lower():
-                print(f"— rate limited, stopping")
-                print(f"\nStopping: API rate limit reached ({api_calls} calls used)")
-                break
-            print(f"— search error: {e}")
-            failed += 1
-            time.sleep(DELAY)
-            continue
-
-        if not results:
-            # Mark as N/A so we don't retry this movie
-            pad = " " * (indent + 4)
-            na_line = f"{pad}- IMDB: N/A\n"
-            insert_at = find_insert_after(lines, idx, indent)
-            if not dry_run:
-                lines[insert_at:insert_at] = [na_line]
-                offset += 1
-            print("— not found (marked N/A)")
-            skipped += 1
-            time.sleep(DELAY)
-            continue
+    deferred = 0
+    written = 0
+    lost = 0
+    patches = []  # (anchor, lines, title, outcome) not yet written
 
-        # Auto-match: exact title > first result.
-        # If user-supplied year is present, prefer the exact-title result whose
-        # Year matches; otherwise fall back to the first exact-title hit; if
-        # nothing exact, take OMDb's top relevance result.
-        match = results[0]
-        exact = [r for r in results if r["Title"].lower() == title.lower()]
-        ambiguous_count = 0
-        if exact:
-            if user_year:
-                year_match = [r for r in exact if r.get("Year", "").startswith(user_year)]
-                match = year_match[0] if year_match else exact[0]
-                if not year_match and len(exact) > 1:
-                    ambiguous_count = len(exact)
+    def log(title, outcome, error=None):
+        if not dry_run:
+            journal.record(title, outcome, error)
+
+    def checkpoint():
+        # Locked, atomic, and applied to the file as it is now. Outcomes are
+        # journaled only for patches that made it into the file.
+        nonlocal written, lost
+        if not patches or dry_run:
+            return
+        applied = []
+
+        def edit(text):
+            text, applied[:] = apply_patches(text, [(anchor, new_lines) for anchor, new_lines, *_ in patches])
+            return text
+
+        logfile.update(MOVIES_FILE, edit)
+        for (_anchor, _lines, title, outcome), ok in zip(patches, applied):
+            if ok:
+                log(title, outcome)
+                written += 1
             else:
-                match = exact[0]
-                if len(exact) > 1:
-                    ambiguous_count = len(exact)
-
+                print(f"  {title}: changed in movies.log since it was read; not written")
+                lost += 1
+        patches.clear()
+
+    with client, ThreadPoolExecutor(WORKERS) as pool:
+        # Lookups run ahead on the pool in priority order, so the budget goes
+        # to the first movies; once it's spent, later ones still get answered
+        # from the cache and the rest raise BudgetExhausted without a call
+        futures = [pool.submit(lookup, client, movie.title, read_user_year(movie)) for movie in ready]
         try:
-            d = omdb_details(api_key, match["imdbID"])
-            api_calls += 1
-        except Exception as e:
-            err_str = str(e)
-            if "401" in err_str or "limit" in err_str.lower():
-                print(f"— rate limited, stopping")
-                print(f"\nStopping: API rate limit reached ({api_calls} calls used)")
-                break
-            print(f"— details error: {e}")
-            failed += 1
-            time.sleep(DELAY)
-            continue
-
-        if not d:
-            print("— no details")
-            skipped += 1
-            time.sleep(DELAY)
-            continue
-
-        new_lines = build_imdb_lines(d, indent)
-        if not new_lines:
-            print("— no data")
-            skipped += 1
-            time.sleep(DELAY)
-            continue
-
-        if ambiguous_count:
-            pad = " " * (indent + 4)
-            new_lines.insert(0, f"{pad}- enrich-warning: {ambiguous_count} OMDb candidates with exact title; first one used\n")
-
-        insert_at = find_insert_after(lines, idx, indent)
-
-        if not dry_run:
-            lines[insert_at:insert_at] = new_lines
-            offset += len(new_lines)
-
-        enriched += 1
-        na = lambda v: v if v and v != "N/A" else None
-        year = na(d.get("Year")) or "?"
-        rating = na(d.get("imdbRating")) or "?"
-        print(f"— {d.get('Title')} ({year}) ★{rating} [+{len(new_lines)} lines]")
-
-        time.sleep(DELAY)
+            for i, (movie, future) in enumerate(zip(ready, futures)):
+                indent, title, user_year = movie.indent, movie.title, read_user_year(movie)
+                label = f"[{i+1}/{len(ready)}] {title}{' (' + user_year + ')' if user_year else ''}"
+                try:
+                    d, ambiguous_count = future.result()
+                except omdb.BudgetExhausted:
+                    deferred += 1
+                    continue
+                except Exception as e:
+                    print(f"{label} — lookup error: {e}")
+                    log(title, "error", str(e))
+                    failed += 1
+                    continue
+                print(label, end=" ")
+
+                if d is None:
+                    # Mark as N/A so we don't retry this movie
+                    patches.append((movie_anchor(lines, movie), [f"{' ' * (indent + 4)}- IMDB: N/A\n"],
+                                    title, "not_found"))
+                    print("— not found (marked N/A)")
+                    skipped += 1
+                elif not d:
+                    print("— no details")
+                    log(title, "no_details")
+                    skipped += 1
+                else:
+                    new_lines = build_imdb_lines(d, indent)
+                    if not new_lines:
+                        print("— no data")
+                        log(title, "no_data")
+                        skipped += 1
+                        continue
+                    if ambiguous_count:
+                        pad = " " * (indent + 4)
+                        new_lines.insert(0, f"{pad}- enrich-warning: {ambiguous_count} OMDb candidates with exact title; first one used\n")
+                    patches.append((movie_anchor(lines, movie), new_lines, title, "enriched"))
+                    enriched += 1
+                    na = lambda v: v if v and v != "N/A" else None
+                    year = na(d.get("Year")) or "?"
+                    rating = na(d.get("imdbRating")) or "?"
+                    print(f"— {d.get('Title')} ({year}) ★{rating} [+{len(new_lines)} lines]")
+
+                if len(patches) >= CHECKPOINT_EVERY:
+                    checkpoint()
+        except KeyboardInterrupt:
+            print(f"\nInterrupted; saving what's done (re-running reuses the cached lookups)")
+            for future in futures:
+                future.cancel()
+        finally:
+            checkpoint()
 
     # Summary
     print(f"\n{'=' * 50}")
     print(f"Enriched:  {enriched}")
     print(f"Skipped:   {skipped}")
     print(f"Failed:    {failed}")
-    print(f"API calls: {api_calls}")
-
-    if not dry_run and enriched > 0:
-        MOVIES_FILE.write_text("".join(lines), encoding="utf-8")
+    if lost:
+        print(f"Not written: {lost} (edited in movies.log meanwhile; re-run to retry from the cache)")
+    if deferred:
+        print(f"Deferred:  {deferred} (no API budget left; run again tomorrow)")
+    if waiting:
+        print(f"Backing off: {len(waiting)} (failed before; see {JOURNAL_FILE.name})")
+    print(f"API calls: {client.calls} ({client.hits} answered from cache)")
+
+    if written:
         print(f"\nChanges written to {MOVIES_FILE}")
     elif dry_run:
         print(f"\nDry run complete. Run without --dry-run to apply.")
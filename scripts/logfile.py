@@ -0,0 +1,136 @@
+"""Safe read-modify-write for movies.log and the other .log files.
+
+Every tool that rewrites movies.log (serve.py, enrich_all.py,
+fix_recommenders.py, movies/movie, the pre-commit hook) goes through here:
+
+- read() returns the text with a hash of its bytes.
+- write() takes an advisory lock on a sidecar file (.<name>.lock), checks
+  that the file still hashes to what the caller read (optimistic
+  concurrency: ConflictError if someone else wrote in between), then writes
+  a temp file in the same directory, fsyncs it and renames it over the
+  original. Readers never see a truncated file and no edit is silently lost.
+- update() wraps read + edit + write and retries the edit on conflict.
+
+Locks are flock(2) locks, so shell scripts can join in with flock(1) on the
+same .lock file.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+RETRIES = 5
+
+
+class ConflictError(Exception):
+    """The file changed between read() and write()."""
+
+
+def lock_path(path):
+    path = Path(path)
+    return path.with_name(f".{path.name}.lock")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextmanager
+def locked(path):
+    """Hold the advisory write lock for path (blocks until it is free)."""
+    with open(lock_path(path), "a") as f:
+        if HAS_FCNTL:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if HAS_FCNTL:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read(path):
+    """Return (text, hash) of path."""
+    data = Path(path).read_bytes()
+    return data.decode("utf-8"), content_hash(data)
+
+
+def current_hash(path):
+    """Hash of path's bytes, or None if it doesn't exist."""
+    try:
+        return content_hash(Path(path).read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def _replace(path, data):
+    """Write data to a temp file next to path, fsync, rename over path."""
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write(path, text, expected=None):
+    """Atomically replace path with text and return the new hash.
+
+    With expected (a hash from read()), raise ConflictError instead of
+    writing if the file no longer has that content."""
+    path = Path(path)
+    data = text.encode("utf-8")
+    with locked(path):
+        if expected is not None and current_hash(path) != expected:
+            raise ConflictError(f"{path.name} changed since it was read")
+        _replace(path, data)
+    return content_hash(data)
+
+
+def update(path, edit, retries=RETRIES):
+    """Apply edit(text) -> new text to path; re-read and re-apply on conflict.
+
+    edit may run more than once, so it should only compute. Returns True if
+    the file was changed."""
+    for _ in range(retries):
+        text, digest = read(path)
+        new = edit(text)
+        if new == text:
+            return False
+        try:
+            write(path, new, expected=digest)
+            return True
+        except ConflictError:
+            continue
+    raise ConflictError(f"{Path(path).name} kept changing; gave up after {retries} tries")
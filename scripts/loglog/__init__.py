@@ -0,0 +1,20 @@
+"""Parsed tree model for the hierarchical .log files (movies.log, books.log, ...).
+
+    import loglog
+    root = loglog.load("books.log")        # one pass, lossless
+    for item in loglog.classify(root, tiers=["I recommend"]):
+        ...
+    assert loglog.dump(root) == open("books.log").read()
+
+tree holds the line-level indent tree (Node, parse, dump); classify turns
+it into the Sections and Items the web viewer shows, by the same rules as
+shared/loglog-viewer.js.
+"""
+
+from .classify import Item, Section, classify, collect_text, extract_properties
+from .tree import Node, dump, load, parse, parse_text, split_lines
+
+__all__ = [
+    "Item", "Node", "Section", "classify", "collect_text", "dump",
+    "extract_properties", "load", "parse", "parse_text", "split_lines",
+]
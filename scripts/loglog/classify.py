@@ -0,0 +1,172 @@
+"""Sections and items over the indent tree (classifyTree / extractProperties in
+shared/loglog-viewer.js, same rules, so scripts and the viewer agree).
+
+A checkbox line is always an item; a tier name is always a section; other
+lines with children are items when everything under them reads as
+properties or notes, and sections otherwise. An item's children become its
+properties ("- key: value", "- key:" over a list, a lone URL as "url") and
+child_texts (plain notes).
+"""
+
+import re
+
+from .tree import CHECKBOX_RE, KEY_ONLY_RE, PROPERTY_RE
+
+URL_RE = re.compile(r"https?://\S+$")
+URL_KEY_RE = re.compile(r"https?$", re.IGNORECASE)
+
+
+class Section:
+    __slots__ = ("name", "depth", "node", "is_tier", "children")
+
+    def __init__(self, name, depth, node, children, is_tier=False):
+        self.name = name
+        self.depth = depth
+        self.node = node
+        self.is_tier = is_tier
+        self.children = children
+
+    def __repr__(self):
+        return f"Section({self.name!r}, line={self.node.line}, children={len(self.children)})"
+
+
+class Item:
+    """checkbox is the lowercased mark (" " for "[]"), or None for a plain item."""
+
+    __slots__ = ("name", "depth", "node", "checkbox", "properties", "child_texts")
+
+    def __init__(self, name, depth, node, checkbox=None):
+        self.name = name
+        self.depth = depth
+        self.node = node
+        self.checkbox = checkbox
+        self.properties = {}
+        self.child_texts = []
+
+    def __repr__(self):
+        return f"Item({self.name!r}, line={self.node.line}, checkbox={self.checkbox!r})"
+
+
+def classify(root, tiers=()):
+    """Classify the top-level nodes under root. tiers are names (any case)
+    that are always sections, like the viewer's config.tiers."""
+    return _classify_children(root.children, {tier.lower() for tier in tiers}, 0)
+
+
+def _classify_children(nodes, tiers, depth):
+    result = []
+    for node in nodes:
+        classified = _classify(node, tiers, depth)
+        if classified is not None:
+            result.append(classified)
+    return result
+
+
+def _strip_dash(text):
+    return text[1:].lstrip() if text.startswith("-") else text
+
+
+def _can_be_property(node):
+    return node.is_property_line() or (not node.children and not node.text.startswith("["))
+
+
+def _classify(node, tiers, depth):
+    raw = node.text
+    cb = CHECKBOX_RE.match(raw)
+    name = node.name
+    children = node.children
+    # Skip empty nodes (bare dashes, empty checkboxes)
+    if not name and not children:
+        return None
+
+    if cb:
+        item = Item(name, depth, node, (cb.group(1) or " ").lower())
+        if children:
+            extract_properties(children, item)
+        return item
+
+    if name.lower() in tiers:
+        return Section(name, depth, node, _classify_children(children, tiers, depth + 1), is_tier=True)
+
+    is_bare_name = not raw.startswith("- ") and raw != "-"
+    if is_bare_name and children:
+        if all(_can_be_property(child) for child in children):
+            item = Item(name, depth, node)
+            extract_properties(children, item)
+            return item
+        return Section(name, depth, node, _classify_children(children, tiers, depth + 1))
+
+    if not children:
+        return Item(name, depth, node)
+
+    # Dash-prefixed with children: sub-categories if all are plain leaves
+    if len(children) >= 2 and all(not child.children and not child.is_property_line() for child in children):
+        return Section(name, depth, node, _classify_children(children, tiers, depth + 1))
+    if all(_can_be_property(child) for child in children):
+        item = Item(name, depth, node)
+        extract_properties(children, item)
+        return item
+    return Section(name, depth, node, _classify_children(children, tiers, depth + 1))
+
+
+def extract_properties(children, item):
+    """Fill item.properties and item.child_texts from its child nodes."""
+    for child in children:
+        raw = child.text
+
+        # A line that is exactly one URL → the "url" property (first one; later ones are notes)
+        bare = _strip_dash(raw).strip()
+        if URL_RE.match(bare) and bare[-1] not in ".,;:!?)]" and not child.children:
+            if "url" not in item.properties:
+                item.properties["url"] = bare
+            else:
+                item.child_texts.append(bare)
+            continue
+
+        m = PROPERTY_RE.match(raw)
+        if m and not URL_KEY_RE.match(m.group(1).strip()):
+            value = m.group(2).strip()
+            if child.children:
+                value += "\n" + collect_text(child.children)
+            item.properties[m.group(1).strip().lower()] = value
+            continue
+
+        m = KEY_ONLY_RE.match(raw)
+        if m:
+            key = m.group(1).strip().lower()
+            if not child.children:
+                item.properties[key] = ""
+            elif all(PROPERTY_RE.match(sub.text) for sub in child.children):
+                # "- key:" over "key: value" lines → merge them individually
+                for sub in child.children:
+                    sm = PROPERTY_RE.match(sub.text)
+                    value = sm.group(2).strip()
+                    if sub.children:
+                        value += "\n" + collect_text(sub.children)
+                    item.properties[sm.group(1).strip().lower()] = value
+            else:
+                item.properties[key] = collect_text(child.children)
+            continue
+
+        # Bare name over a list (no colon): "- Author", "- review"
+        if child.children:
+            key = _strip_dash(raw)
+            item.properties[(key[:-1] if key.endswith(":") else key).strip().lower()] = collect_text(child.children)
+            continue
+
+        if bare:
+            item.child_texts.append(bare)
+
+
+def collect_text(nodes):
+    """Text of nodes and everything under them, one line each, dashes dropped."""
+    parts = []
+    for node in nodes:
+        text = _strip_dash(node.text).strip()
+        if text:
+            parts.append(text)
+        if node.children:
+            sub = collect_text(node.children)
+            if sub:
+                parts.append(sub)
+    return "\n".join(parts)
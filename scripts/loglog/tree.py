@@ -0,0 +1,145 @@
+"""Indent tree for .log files (the Python side of buildTree in shared/loglog-viewer.js).
+
+Every non-blank line becomes a Node whose children are the following lines
+indented deeper than it. Blank lines are kept on the node just before them
+(its `after`), so dump() gives back the exact text, whitespace and line
+endings included, and a missing final newline stays missing.
+"""
+
+import re
+
+# On a line's stripped text: "[x] Name", "[ ] Name", "[] Name", "[-] Name", "[?] Name"
+CHECKBOX_RE = re.compile(r"\[([x \-?]?)\]\s*(.*)", re.IGNORECASE)
+# Property keys as the viewer sees them; \w is ASCII there too
+_KEY = r"\w[\w\s/&'()\-]*?"
+PROPERTY_RE = re.compile(rf"-?\s*({_KEY}):\s+(.+)$", re.ASCII)
+KEY_ONLY_RE = re.compile(rf"-?\s*({_KEY}):\s*$", re.ASCII)
+_PROPERTY_LINE_RE = re.compile(rf"-?\s*{_KEY}:(?:\s|$)", re.ASCII)
+
+
+class Node:
+    """One line of a .log file and the lines nested under it.
+
+    raw is the line as read, line ending included; indent is its count of
+    leading whitespace characters (-1 for the root); line its 0-based line
+    number. after holds the raw blank lines that follow it, if any."""
+
+    __slots__ = ("raw", "indent", "line", "parent", "children", "after")
+
+    def __init__(self, raw, indent, line, parent):
+        self.raw = raw
+        self.indent = indent
+        self.line = line
+        self.parent = parent
+        self.children = ()  # a list once there is a child
+        self.after = None
+
+    def __repr__(self):
+        return f"Node({self.text!r}, line={self.line}, indent={self.indent}, children={len(self.children)})"
+
+    def append(self, child):
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
+
+    @property
+    def text(self):
+        """The line without indentation or line ending."""
+        return self.raw.strip()
+
+    @property
+    def checkbox(self):
+        """The mark of a checkbox item, lowercased (" " for "[]"), or None."""
+        m = CHECKBOX_RE.match(self.text)
+        return (m.group(1) or " ").lower() if m else None
+
+    @property
+    def name(self):
+        """The line's label: checkbox and leading "- " removed, one trailing ":" dropped."""
+        text = self.text
+        m = CHECKBOX_RE.match(text)
+        if m:
+            text = m.group(2)
+        elif text.startswith("-"):
+            text = text[1:].lstrip()
+        return (text[:-1] if text.endswith(":") else text).strip()
+
+    @property
+    def property(self):
+        """(lowercased key, value) for a "- key: value" line, (key, "") for
+        "- key:", else None."""
+        text = self.text
+        m = PROPERTY_RE.match(text)
+        if m:
+            return m.group(1).strip().lower(), m.group(2).strip()
+        m = KEY_ONLY_RE.match(text)
+        if m:
+            return m.group(1).strip().lower(), ""
+        return None
+
+    def is_property_line(self):
+        return _PROPERTY_LINE_RE.match(self.text) is not None
+
+    def walk(self):
+        """This node and everything under it, in file order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(reversed(node.children))
+
+
+def split_lines(text):
+    """text split after each "\\n", endings kept (unlike str.splitlines,
+    which also breaks on \\r, \\f and others)."""
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def parse(lines):
+    """Build the tree from an iterable of lines (endings kept) in one pass;
+    a file opened with newline="" works. Returns the root node."""
+    root = Node("", -1, -1, None)
+    stack = [root]
+    prev = root  # where blank lines go
+    for number, raw in enumerate(lines):
+        stripped = raw.lstrip()
+        if not stripped:
+            if prev.after is None:
+                prev.after = [raw]
+            else:
+                prev.after.append(raw)
+            continue
+        indent = len(raw) - len(stripped)
+        while stack[-1].indent >= indent:
+            stack.pop()
+        parent = stack[-1]
+        prev = Node(raw, indent, number, parent)
+        parent.append(prev)
+        stack.append(prev)
+    return root
+
+
+def parse_text(text):
+    return parse(split_lines(text))
+
+
+def load(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return parse_text(f.read())
+
+
+def dump(node):
+    """The text of node and everything under it, exactly as parsed (plus edits)."""
+    parts = []
+    for each in node.walk():
+        parts.append(each.raw)
+        if each.after:
+            parts.extend(each.after)
+    return "".join(parts)
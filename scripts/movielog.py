@@ -0,0 +1,87 @@
+"""Movie records for movies.log, on top of the loglog tree (scripts/loglog).
+
+movies.log is an indented outline: section and category headings
+("- watched:", "- Recommended by:", "- Anton K:"), movie lines
+("[x] Title") and, under each movie, its properties ("- Key: value") and
+sub-lists (the cast). A movie's span is its subtree: it runs to the next
+non-blank line indented no deeper than it, so blank lines inside or right
+after it belong to it (the same rule find_insert_after() used).
+
+parse_movies() yields one Movie record per movie; enrich_all.py and
+fix_recommenders.py read the file through it, and serve.py keeps the
+loglog tree itself in memory.
+"""
+
+import re
+
+import loglog
+
+MOVIE_RE = re.compile(r"^(\s*)\[([x\-? ]?)\]\s*(.+?)\s*$", re.IGNORECASE)
+
+
+class Movie:
+    """One movie line and what's under it.
+
+    line is the 0-based index of the movie line and end the index just past
+    its span (where new children go). properties maps each lowercased key
+    found under it to its first value. parents holds (indent, text) of the
+    enclosing headings (and movies, if it's nested in one), outermost first."""
+
+    __slots__ = ("line", "indent", "mark", "title", "end", "properties", "parents")
+
+    def __init__(self, line, indent, mark, title, parents):
+        self.line = line
+        self.indent = indent
+        self.mark = mark
+        self.title = title
+        self.end = None
+        self.properties = {}
+        self.parents = parents
+
+    def __repr__(self):
+        return f"Movie({self.title!r}, line={self.line}, indent={self.indent}, end={self.end})"
+
+
+def property_of(line):
+    """(lowercased key, value) of a "- Key: value" line, or None.
+
+    The dash is optional (some hand-edited lines lack it); "- Key:" with no
+    value, as on a "- Cast (IMDb):" heading, gives an empty value. str
+    methods rather than a regex: this runs on nearly every line."""
+    key, colon, value = line.partition(":")
+    if not colon:
+        return None
+    key = key.strip()
+    if key[:1] == "-":
+        key = key[1:].lstrip()
+    return (key.lower(), value.strip()) if key else None
+
+
+def parse_movies(lines):
+    """Yield a Movie for every movie line, in file order.
+
+    lines is any iterable of lines (endings kept), a file included; they
+    are read into a loglog tree first, so records come out complete."""
+    movies = []
+    stack = [(node, (), None) for node in reversed(loglog.parse(lines).children)]
+    while stack:
+        node, parents, movie = stack.pop()  # parents and innermost movie around node
+        raw = node.raw
+        m = MOVIE_RE.match(raw) if raw[node.indent] == "[" else None
+        if m:
+            movie = Movie(node.line, node.indent, m.group(2), m.group(3).strip(), parents)
+            last = node
+            while last.children:
+                last = last.children[-1]
+            movie.end = last.line + 1 + len(last.after or ())
+            movies.append(movie)
+            parents += ((node.indent, raw.strip()),)
+        elif movie is not None:
+            prop = property_of(raw)
+            if prop:
+                movie.properties.setdefault(*prop)
+        else:
+            parents += ((node.indent, raw.strip()),)
+        if node.children:
+            stack.extend((child, parents, movie) for child in reversed(node.children))
+    yield from movies
@@ -0,0 +1,230 @@
+"""OMDb client for enrich_all.py: cached, rate-limited, safe to share across threads.
+
+- Each thread keeps one keep-alive HTTP connection to the API.
+- A token bucket spaces requests (RATE per second, bursts of BURST), and
+  the calls made per UTC day are counted in the cache database, so the
+  free tier's 1000/day budget holds across runs; past DAILY_BUDGET the
+  client raises BudgetExhausted without touching the network.
+- Responses are stored in SQLite keyed by query (minus the API key):
+  found results for TTL, "not found" answers for NEGATIVE_TTL. Cache hits
+  cost nothing against the budget.
+
+OMDB_URL and OMDB_CACHE in the environment override the endpoint and the
+cache file, e.g. to run against a local fake server:
+
+    OMDB_URL=http://127.0.0.1:9000/ OMDB_CACHE=/tmp/omdb.sqlite python3 enrich_all.py
+"""
+
+import http.client
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+
+OMDB_URL = os.environ.get("OMDB_URL", "http://www.omdbapi.com/")
+CACHE_FILE = Path(os.environ.get("OMDB_CACHE", Path(__file__).parent.parent / ".omdb_cache.sqlite"))
+DAILY_BUDGET = 990  # of OMDb's 1000/day, leaving some buffer
+RATE = 10.0  # requests per second; OMDb documents no per-second limit
+BURST = 10
+TTL = 30 * 86400  # seconds; ratings and such drift slowly
+NEGATIVE_TTL = 7 * 86400  # "not found" may be a title OMDb adds later
+TIMEOUT = 10
+
+
+class OMDbError(Exception):
+    """OMDb answered with an HTTP error."""
+
+
+class BudgetExhausted(OMDbError):
+    """No more calls can be made: today's budget is spent (ours, or OMDb
+    says so), or OMDb rejected the key."""
+
+
+class TokenBucket:
+    """Blocks callers so that at most rate calls/second go out, after a burst."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Cache:
+    """SQLite file holding OMDb responses and the number of calls made per day."""
+
+    def __init__(self, path=CACHE_FILE):
+        self.db = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses"
+                            " (query TEXT PRIMARY KEY, body TEXT, fetched REAL NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS usage (day TEXT PRIMARY KEY, calls INTEGER NOT NULL)")
+
+    def get(self, query):
+        """(True, response) on a fresh hit (response None if negative), else (False, None)."""
+        with self.lock:
+            row = self.db.execute("SELECT body, fetched FROM responses WHERE query = ?", (query,)).fetchone()
+        if row is None:
+            return False, None
+        body, fetched = row
+        if time.time() - fetched > (TTL if body is not None else NEGATIVE_TTL):
+            return False, None
+        return True, json.loads(body) if body is not None else None
+
+    def put(self, query, response):
+        body = json.dumps(response) if response is not None else None
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (query, body, time.time()))
+
+    def calls(self, day):
+        with self.lock:
+            row = self.db.execute("SELECT calls FROM usage WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else 0
+
+    def spend(self, day, limit):
+        """Count one call against day's budget; False (and nothing counted) if it's spent."""
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT INTO usage VALUES (?, 1) ON CONFLICT(day) DO UPDATE SET calls = calls + 1"
+                " WHERE calls < ?", (day, limit))
+            return cur.rowcount == 1
+
+    def exhaust(self, day, limit):
+        """Record that day's budget is gone (OMDb said so before we thought it was)."""
+        with self.lock:
+            self.db.execute("INSERT INTO usage VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET calls = MAX(calls, ?)",
+                            (day, limit, limit))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class Client:
+    """search() and details() against OMDb, through the cache, budget and rate limit.
+
+    Thread-safe; use it as a context manager to close the cache."""
+
+    def __init__(self, api_key, url=OMDB_URL, cache=None, budget=DAILY_BUDGET, rate=RATE, burst=BURST):
+        self.api_key = api_key
+        parts = urllib.parse.urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.path = parts.path or "/"
+        self.cache = cache or Cache()
+        self.budget = budget
+        self.bucket = TokenBucket(rate, burst)
+        self.calls = 0  # network calls made by this client
+        self.hits = 0  # answered from the cache
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self.cache.close()
+
+    def remaining(self):
+        """Calls left in today's budget."""
+        return max(0, self.budget - self.cache.calls(today()))
+
+    def search(self, title, year=None):
+        """Search results (dicts with Title, Year, imdbID, ...); [] if none."""
+        params = {"s": title.strip().lower(), "type": "movie"}
+        if year:
+            params["y"] = year
+        data = self._query(params)
+        return data.get("Search", []) if data else []
+
+    def details(self, imdb_id):
+        """Full record for an IMDb ID, or None."""
+        return self._query({"i": imdb_id, "plot": "short"})
+
+    def _query(self, params):
+        query = urllib.parse.urlencode(sorted(params.items()))
+        hit, data = self.cache.get(query)
+        if hit:
+            with self._stats_lock:
+                self.hits += 1
+            return data
+        day = today()
+        if not self.cache.spend(day, self.budget):
+            raise BudgetExhausted(f"daily budget of {self.budget} calls used up")
+        self.bucket.take()
+        with self._stats_lock:
+            self.calls += 1
+        data = self._get(f"{query}&{urllib.parse.urlencode({'apikey': self.api_key})}")
+        if data.get("Response") == "False":
+            error = data.get("Error", "")
+            if "limit" in error.lower():
+                self.cache.exhaust(day, self.budget)
+                raise BudgetExhausted(f"OMDb: {error}")
+            data = None  # "Movie not found!", "Incorrect IMDb ID.", "Too many results."
+        self.cache.put(query, data)
+        return data
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, timeout=TIMEOUT)
+            with self._stats_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _get(self, query):
+        """GET path?query on this thread's connection; one retry if the server
+        dropped the idle keep-alive connection."""
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("GET", f"{self.path}?{query}")
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if resp.status == 401:
+                # Over the limit or a bad key; either way no further call will work
+                try:
+                    error = json.loads(body).get("Error", "unauthorized")
+                except ValueError:
+                    error = "unauthorized"
+                if "limit" in error.lower():
+                    self.cache.exhaust(today(), self.budget)
+                raise BudgetExhausted(f"OMDb: HTTP 401, {error}")
+            if resp.status != 200:
+                raise OMDbError(f"OMDb: HTTP {resp.status}")
+            return json.loads(body)
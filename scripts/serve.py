@@ -1,17 +1,342 @@
 #!/usr/bin/env python3
-"""Local dev server for the notes site with movies enrichment API."""
+"""Local dev server for the notes site with movies enrichment API.
 
+Requests are handled on their own threads over HTTP/1.1 keep-alive. Files
+are served with an ETag and revalidated on every load (If-None-Match gets
+a 304), so on-disk edits show up at once while unchanged files are not
+re-downloaded. Content-hashed names (fingerprinted static files, image
+variants) are cached for good. Single byte ranges are honoured so audio
+and video can seek.
+"""
+
+import email.utils
 import json
 import os
 import re
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import logfile
+import loglog
+from movielog import MOVIE_RE, property_of
+
 MOVIES_FILE = Path(__file__).parent.parent / "movies.log"
 PORT = 8787
 
+# .<10 hex>.ext from build.py's static fingerprinting; <32 hex>... for
+# thumbnails and responsive image variants
+IMMUTABLE_RE = re.compile(r"(?:\.[0-9a-f]{10}|/[0-9a-f]{32}[^/]*)\.\w+$")
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(header, size):
+    """(start, end) of a single "bytes=" range, inclusive; None to ignore the
+    header and serve the whole file (malformed or multiple ranges). A start
+    at or past size means the range is unsatisfiable."""
+    m = RANGE_RE.fullmatch(header.strip())
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if not first:  # suffix range: the last N bytes
+        return max(0, size - int(last)) if int(last) else size, size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class NotWritten(Exception):
+    """An insert was made in memory but could not be written to the file."""
+
+
+class MoviesLog:
+    """movies.log parsed into a loglog tree and held in memory.
+
+    A line's node holds every following line indented deeper than it (blank
+    lines ride on the line before them), so a movie's children block is its
+    subtree and appending under it is a list append. movies maps
+    (lowercased title, indent) to the first movie line with that key;
+    sections maps each top-level heading ("watched", "To Watch", ...) to
+    its node.
+
+    An insert returns once it is on disk, written through logfile.write
+    (locked, atomic, and refused if the file no longer hashes to what was
+    loaded). Inserts made while a write is in progress wait for it and then
+    share the next one. The file is re-read when its mtime/size differ from
+    what was loaded or last written, or when a write is refused; inserts
+    not yet written are then replayed onto the new contents. An insert that
+    can't be written, or whose movie is gone on replay, is reported to its
+    caller (NotWritten) and dropped from memory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()  # held by the request writing for everyone
+        self.pending = []  # (ticket, title, indent, lines) not yet on disk
+        self.tickets = 0  # inserts made so far; each is numbered
+        self.settled = 0  # inserts up to this number are written or failed
+        self.failed = {}  # ticket -> why that insert was not written
+        self.writing = False  # a write is in progress; the file's stamp is not ours yet
+        self._load()
+
+    def _load(self):
+        self.stamp = self._stat()
+        text, self.digest = logfile.read(self.path)
+        self.root = loglog.parse_text(text)
+        self.sizes = {}  # node -> lines in its subtree, filled in by _size
+        self.movies = {}
+        self.sections = {
+            node.text.lstrip("- ").rstrip(":").strip(): node for node in self.root.children}
+        stack = list(reversed(self.root.children))
+        while stack:
+            node = stack.pop()
+            raw = node.raw
+            if raw[node.indent] == "[":
+                m = MOVIE_RE.match(raw)
+                if m:
+                    self.movies.setdefault((m.group(3).strip().lower(), node.indent), node)
+            if node.children:
+                stack.extend(reversed(node.children))
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _sync(self):
+        """Re-read the file if something else changed it, keeping pending inserts."""
+        if not self.writing and self._stat() != self.stamp:
+            pending, self.pending = self.pending, []
+            self._load()
+            for ticket, title, indent, lines in pending:
+                if (title.lower().strip(), indent) in self.movies:
+                    self._insert(title, indent, lines)
+                    self.pending.append((ticket, title, indent, lines))
+                else:
+                    self.failed[ticket] = f"'{title}' is no longer in {self.path.name}"
+
+    def find(self, title, indent):
+        with self.lock:
+            self._sync()
+            return self.movies.get((title.lower().strip(), indent))
+
+    def insert(self, title, indent, lines):
+        """Add lines after a movie's existing children and write them.
+        Returns the 1-based line number of the first added line, or None if
+        the movie isn't there; raises NotWritten if the write failed."""
+        with self.lock:
+            self._sync()
+            movie = self.movies.get((title.lower().strip(), indent))
+            if movie is None:
+                return None
+            added = self._insert(title, indent, lines)
+            ticket = self._queue(title, indent, lines)
+            at_line = self._position(movie, added)
+        error = self._wait_written(ticket)
+        if error:
+            raise NotWritten(error)
+        return at_line
+
+    def insert_many(self, items):
+        """Apply a batch of (title, indent, lines, force) inserts and write
+        the file once, before returning. An item conflicts (and is skipped)
+        when the movie already has one of the properties its lines add,
+        unless force is set. Returns one ("inserted", at_line),
+        ("not_found", None), ("conflict", keys) or ("not_written", error)
+        per item; line numbers are final, after the whole batch."""
+        with self.lock:
+            self._sync()
+            results = []
+            for title, indent, lines, force in items:
+                movie = self.movies.get((title.lower().strip(), indent))
+                if movie is None:
+                    results.append(("not_found", None))
+                    continue
+                clashes = sorted(self.property_keys(movie) & {
+                    prop[0] for prop in (property_of(line) for line in lines
+                                         if len(line) - len(line.lstrip()) == indent + 4)
+                    if prop})
+                if clashes and not force:
+                    results.append(("conflict", clashes))
+                    continue
+                added = self._insert(title, indent, lines)
+                results.append(("inserted", (movie, added, self._queue(title, indent, lines))))
+        errors = {}  # ticket -> why it was not written
+        tickets = [value[2] for status, value in results if status == "inserted"]
+        if tickets:
+            # Waiting on the last ticket hands back (and clears) its own error
+            errors[tickets[-1]] = self._wait_written(tickets[-1])
+        with self.lock:
+            out = []
+            for status, value in results:
+                if status == "inserted":
+                    movie, added, ticket = value
+                    error = errors.get(ticket) or self.failed.pop(ticket, None)
+                    out.append(("not_written", error) if error else ("inserted", self._position(movie, added)))
+                else:
+                    out.append((status, value))
+            return out
+
+    @staticmethod
+    def property_keys(movie):
+        """Lowercased keys of a movie's "- Key: value" child lines."""
+        return {prop[0] for prop in (property_of(child.raw) for child in movie.children) if prop}
+
+    def _position(self, movie, added):
+        """1-based line number of the first added line (where it would go, if none)."""
+        if added:
+            return self.line_of(added[0])
+        return self.line_of(movie) + self._size(movie)
+
+    def _insert(self, title, indent, lines):
+        """Append lines after a movie's children. Returns their new nodes."""
+        movie = self.movies[(title.lower().strip(), indent)]
+        last = movie
+        while last.children:
+            last = last.children[-1]
+        tail = last.after
+        if lines and not (tail[-1] if tail else last.raw).endswith("\n"):
+            # Appending at the end of a file with no final newline: keep it that way
+            if tail:
+                tail[-1] += "\n"
+            else:
+                last.raw += "\n"
+            lines = lines[:-1] + [lines[-1].rstrip("\n")]
+        added = [loglog.Node(line, len(line) - len(line.lstrip()), None, movie) for line in lines]
+        for node in added:
+            movie.append(node)
+        node = movie
+        while node is not None:  # their subtrees grew
+            self.sizes.pop(node, None)
+            node = node.parent
+        return added
+
+    def _size(self, node):
+        """Lines in node's subtree: its own, the blanks after it, its children's."""
+        size = self.sizes.get(node)
+        if size is None:
+            size = (node.parent is not None) + len(node.after or ())
+            size += sum(self._size(child) for child in node.children)
+            self.sizes[node] = size
+        return size
+
+    def line_of(self, node):
+        """1-based line number of node."""
+        number = 1
+        while node.parent is not None:
+            parent = node.parent
+            for sibling in parent.children:
+                if sibling is node:
+                    break
+                number += self._size(sibling)
+            number += (parent.parent is not None) + len(parent.after or ())
+            node = parent
+        return number
+
+    def _queue(self, title, indent, lines):
+        """Mark an insert just made in memory as pending. Returns its ticket."""
+        self.tickets += 1
+        self.pending.append((self.tickets, title, indent, lines))
+        return self.tickets
+
+    def _wait_written(self, ticket):
+        """Block until insert ticket is written (or failed). Requests that
+        arrive while another one writes queue up behind it, and the first
+        of them writes for all. Returns None, or why it wasn't written."""
+        with self.write_lock:
+            if self.settled < ticket:
+                try:
+                    self._write()
+                except (logfile.ConflictError, OSError):
+                    pass  # recorded per insert in self.failed
+        with self.lock:
+            return self.failed.pop(ticket, None)
+
+    def flush(self):
+        """Write pending inserts to disk; see _write."""
+        with self.write_lock:
+            self._write()
+
+    def _write(self):
+        """Write the tree with every pending insert (caller holds
+        write_lock). The file is written outside self.lock, so inserts keep
+        landing in memory meanwhile; they go in the next write. If the write
+        fails, the inserts it carried are marked failed, dropped (the file
+        is re-read and the rest replayed onto it) and the error is raised."""
+        batch = []
+        try:
+            for _ in range(logfile.RETRIES):
+                with self.lock:
+                    self._sync()
+                    batch, last, expected = list(self.pending), self.tickets, self.digest
+                    if not batch:
+                        self.settled = last
+                        return
+                    text = loglog.dump(self.root)
+                    self.writing = True
+                try:
+                    digest = logfile.write(self.path, text, expected=expected)
+                except logfile.ConflictError:
+                    with self.lock:
+                        self.stamp = None  # changed under us: reload and replay
+                    continue
+                finally:
+                    self.writing = False
+                with self.lock:
+                    self.digest = digest
+                    self.stamp = self._stat()
+                    del self.pending[:len(batch)]
+                    self.settled = last
+                return
+            raise logfile.ConflictError(f"{self.path.name} kept changing; inserts not written")
+        except (logfile.ConflictError, OSError) as e:
+            with self.lock:
+                print(f"{self.path.name}: {len(batch)} insert(s) not written: {e}", file=sys.stderr)
+                for ticket, *_ in batch:
+                    self.failed[ticket] = f"not written: {e}"
+                del self.pending[:len(batch)]
+                self.settled = max(self.settled, batch[-1][0] if batch else 0)
+                self.stamp = None  # re-read, which drops them from memory
+            raise
+
+
+def enrichment_lines(indent, properties, cast, imdb_url):
+    """movies.log lines for an enrichment of the movie at indent."""
+    prop_indent = indent + 4
+    pad = " " * prop_indent
+    new_lines = []
+    for prop in properties:
+        new_lines.append(f"{pad}- {prop['key']}: {prop['value']}\n")
+    if cast:
+        new_lines.append(f"{pad}- Cast (IMDb):\n")
+        cast_pad = " " * (prop_indent + 4)
+        for actor in cast:
+            new_lines.append(f"{cast_pad}- {actor}\n")
+    if imdb_url:
+        new_lines.append(f"{pad}- IMDB: {imdb_url}\n")
+    return new_lines
+
+
+_movies = None
+_movies_lock = threading.Lock()
+
+
+def movies_log():
+    """The shared MoviesLog for MOVIES_FILE, loaded on first use."""
+    global _movies
+    with _movies_lock:
+        if _movies is None or _movies.path != MOVIES_FILE:
+            _movies = MoviesLog(MOVIES_FILE)
+        return _movies
+
 
 class Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map,
+                      ".avif": "image/avif", ".webp": "image/webp"}
+    _range = None  # (offset, count) of the file body being sent
+
     def do_GET(self):
         if self.path == "/api/omdb-key":
             key = os.environ.get("OMDB_API_KEY", "")
@@ -19,17 +344,86 @@ class Handler(SimpleHTTPRequestHandler):
         else:
             super().do_GET()
 
-    def end_headers(self):
-        # In dev, never let the browser cache anything — modules and CSS
-        # need to reflect on-disk edits without manual cache-busting.
-        self.send_header("Cache-Control", "no-store, must-revalidate")
-        self.send_header("Pragma", "no-cache")
-        self.send_header("Expires", "0")
-        super().end_headers()
+    def send_head(self):
+        """Serve a file with ETag revalidation and Range support. Directory
+        redirects and listings are left to SimpleHTTPRequestHandler."""
+        self._range = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split("?", 1)[0].endswith("/"):
+                return super().send_head()
+            for index in ("index.html", "index.htm"):
+                if os.path.isfile(os.path.join(path, index)):
+                    path = os.path.join(path, index)
+                    break
+            else:
+                return super().send_head()
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        try:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+            cache = ("public, max-age=31536000, immutable"
+                     if IMMUTABLE_RE.search(self.path.split("?", 1)[0]) else "no-cache")
+
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match and (if_none_match.strip() == "*" or etag in (
+                    tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+                f.close()
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", cache)
+                self.end_headers()
+                return None
+
+            start, end = 0, size - 1
+            byte_range = None
+            if self.headers.get("Range") and self.headers.get("If-Range", etag) == etag:
+                byte_range = parse_range(self.headers["Range"], size)
+            if byte_range and byte_range[0] >= size:
+                f.close()
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+            self.send_header("ETag", etag)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Cache-Control", cache)
+            self.end_headers()
+            self._range = (start, end - start + 1)
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        """Send the requested byte range of a file (zero-copy where the OS allows)."""
+        if self._range is None:  # directory listing
+            return super().copyfile(source, outputfile)
+        offset, count = self._range
+        if count > 0:
+            self.connection.sendfile(source, offset, count)
 
     def do_POST(self):
         if self.path == "/api/enrich":
             self._handle_enrich()
+        elif self.path == "/api/enrich/batch":
+            self._handle_enrich_batch()
         else:
             self.send_error(404)
 
@@ -44,80 +438,84 @@ class Handler(SimpleHTTPRequestHandler):
             cast = body.get("cast", [])
             imdb_url = body.get("imdb_url")
 
-            lines = MOVIES_FILE.read_text(encoding="utf-8").splitlines(keepends=True)
-
-            # Find the movie line
-            movie_idx = self._find_movie(lines, title, indent)
-            if movie_idx is None:
+            result = self._insert_enrichment(title, indent, properties, cast, imdb_url)
+            if result is None:
                 self._json_response(404, {"error": f"Movie '{title}' not found"})
-                return
-
-            # Find insertion point: after movie line + any existing children
-            insert_idx = movie_idx + 1
-            prop_indent = indent + 4
-            while insert_idx < len(lines):
-                line = lines[insert_idx]
-                stripped = line.rstrip("\n")
-                if not stripped.strip():
-                    # blank line - check if next non-blank is still a child
-                    insert_idx += 1
-                    continue
-                line_indent = len(stripped) - len(stripped.lstrip())
-                if line_indent > indent:
-                    insert_idx += 1
-                else:
-                    break
+            else:
+                self._json_response(200, result)
 
-            # Build new lines
-            pad = " " * prop_indent
-            new_lines = []
-            for prop in properties:
-                new_lines.append(f"{pad}- {prop['key']}: {prop['value']}\n")
-            if cast:
-                new_lines.append(f"{pad}- Cast (IMDb):\n")
-                cast_pad = " " * (prop_indent + 4)
-                for actor in cast:
-                    new_lines.append(f"{cast_pad}- {actor}\n")
-            if imdb_url:
-                new_lines.append(f"{pad}- IMDB: {imdb_url}\n")
+        except NotWritten as e:
+            self._json_response(500, {"error": f"Not saved: {e}"})
+        except (json.JSONDecodeError, KeyError) as e:
+            self._json_response(400, {"error": str(e)})
+        except Exception as e:
+            self._json_response(500, {"error": str(e)})
 
-            # Insert
-            lines[insert_idx:insert_idx] = new_lines
+    def _handle_enrich_batch(self):
+        """{"items": [<enrich body, optionally with "force": true>, ...]} ->
+        {"ok", "inserted", "results": [...]}, one result per item in order:
+        {"status": "inserted", "at_line", "added"}, {"status": "not_found"},
+        {"status": "conflict", "keys"} (the movie already has those
+        properties; send "force" to add anyway), {"status": "not_written",
+        "error"} (the write failed) or {"status": "invalid", "error"}. The
+        whole batch is applied with a single write."""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            items = json.loads(self.rfile.read(length))["items"]
+            if not isinstance(items, list):
+                raise KeyError("items")
 
-            MOVIES_FILE.write_text("".join(lines), encoding="utf-8")
+            results = [None] * len(items)
+            batch, slots = [], []
+            for i, item in enumerate(items):
+                try:
+                    lines = enrichment_lines(item["indent"], item.get("properties", []),
+                                             item.get("cast", []), item.get("imdb_url"))
+                    batch.append((item["title"], item["indent"], lines, bool(item.get("force"))))
+                    slots.append((i, len(lines)))
+                except (KeyError, TypeError) as e:
+                    results[i] = {"status": "invalid", "error": str(e)}
 
+            for (i, added), (status, value) in zip(slots, movies_log().insert_many(batch)):
+                if status == "inserted":
+                    results[i] = {"status": status, "at_line": value, "added": added}
+                elif status == "conflict":
+                    results[i] = {"status": status, "keys": value}
+                elif status == "not_written":
+                    results[i] = {"status": status, "error": value}
+                else:
+                    results[i] = {"status": status}
             self._json_response(200, {
                 "ok": True,
-                "added": len(new_lines),
-                "at_line": insert_idx + 1,
+                "inserted": sum(r["status"] == "inserted" for r in results),
+                "results": results,
             })
 
-        except (json.JSONDecodeError, KeyError) as e:
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
             self._json_response(400, {"error": str(e)})
         except Exception as e:
             self._json_response(500, {"error": str(e)})
 
-    def _find_movie(self, lines, title, indent):
-        """Find the line index of a movie entry by title and indent."""
-        title_lower = title.lower().strip()
-        pattern = re.compile(
-            r"^\s*\[[x\-? ]?\]\s*(.+?)\s*$", re.IGNORECASE
-        )
-        for i, line in enumerate(lines):
-            stripped = line.rstrip("\n")
-            line_indent = len(stripped) - len(stripped.lstrip())
-            if line_indent != indent:
-                continue
-            m = pattern.match(stripped)
-            if m and m.group(1).strip().lower() == title_lower:
-                return i
-        return None
+    def _insert_enrichment(self, title, indent, properties, cast, imdb_url):
+        """Insert the enrichment lines under a movie in movies.log. Returns
+        the response payload, or None if the movie isn't there; raises
+        NotWritten if they couldn't be saved."""
+        new_lines = enrichment_lines(indent, properties, cast, imdb_url)
+        at_line = movies_log().insert(title, indent, new_lines)
+        if at_line is None:
+            return None
+        return {
+            "ok": True,
+            "added": len(new_lines),
+            "at_line": at_line,
+        }
 
     def _json_response(self, code, data):
         body = json.dumps(data).encode()
         self.send_response(code)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
         self.wfile.write(body)
@@ -130,11 +528,20 @@ class Handler(SimpleHTTPRequestHandler):
         self.end_headers()
 
     def log_message(self, format, *args):
-        if "/api/" in (args[0] if args else ""):
+        if args and "/api/" in str(args[0]):
             super().log_message(format, *args)
 
 
 if __name__ == "__main__":
     print(f"Serving on http://localhost:{PORT}")
     print(f"Movies file: {MOVIES_FILE}")
-    HTTPServer(("", PORT), Handler).serve_forever()
+    try:
+        ThreadingHTTPServer(("", PORT), Handler).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if _movies is not None:
+            try:
+                _movies.flush()
+            except (logfile.ConflictError, OSError):
+                pass  # flush() reported it